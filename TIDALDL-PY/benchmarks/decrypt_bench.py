@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   decrypt_bench.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   decrypt_file (chunked) against the former whole-file decryption, MB/s and peak RSS
+'''
+import os
+import sys
+import time
+import getopt
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tidal_dl.decryption import decrypt_file
+
+__KEY__ = bytes(range(16))
+__NONCE__ = bytes(range(8))
+
+
+def __decryptWhole__(efile, dfile, key, nonce):
+    '''decrypt_file before the chunked version: the whole track in memory, twice'''
+    from Crypto.Cipher import AES
+    from Crypto.Util import Counter
+    counter = Counter.new(64, prefix=nonce, initial_value=0)
+    decryptor = AES.new(key, AES.MODE_CTR, counter=counter)
+    with open(efile, 'rb') as eflac:
+        flac = decryptor.decrypt(eflac.read())
+        with open(dfile, 'wb') as dflac:
+            dflac.write(flac)
+
+
+def __getPeakRss__():
+    '''Peak RSS of this process in MB, -1 where the resource module is missing (windows)'''
+    try:
+        import resource
+    except ImportError:
+        return -1
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KB elsewhere
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def __runMode__(mode, efile):
+    '''Run in a child process, so that the peak RSS belongs to one mode only'''
+    dfile = efile + '.' + mode
+    func = decrypt_file if mode == 'chunked' else __decryptWhole__
+    start = time.perf_counter()
+    func(efile, dfile, __KEY__, __NONCE__)
+    seconds = time.perf_counter() - start
+    size = os.path.getsize(efile) / 1024 / 1024
+    print('%s %.1f %.1f' % (mode, size / seconds, __getPeakRss__()))
+
+
+def main(argv):
+    opts, args = getopt.getopt(argv, "", ["size=", "mode=", "file="])
+    opts = dict(opts)
+    if '--mode' in opts:
+        __runMode__(opts['--mode'], opts['--file'])
+        return
+
+    sizeMB = int(opts.get('--size', 100))
+    folder = tempfile.mkdtemp()
+    efile = os.path.join(folder, 'track.enc')
+    with open(efile, 'wb') as f:
+        for _ in range(sizeMB):
+            f.write(os.urandom(1024 * 1024))
+
+    print('%d MB encrypted file' % sizeMB)
+    print('%-8s %10s %14s' % ('mode', 'MB/s', 'peak RSS (MB)'))
+    try:
+        for mode in ('whole', 'chunked'):
+            out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                           '--mode', mode, '--file', efile]).decode().split()
+            print('%-8s %10s %14s' % (out[0], out[1], out[2]))
+        same = open(efile + '.whole', 'rb').read() == open(efile + '.chunked', 'rb').read()
+        print('same output: ' + str(same))
+    finally:
+        for name in os.listdir(folder):
+            os.remove(os.path.join(folder, name))
+        os.rmdir(folder)
+
+
+if __name__ == '__main__':
+    # python benchmarks/decrypt_bench.py [--size MB]
+    main(sys.argv[1:])
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   import_bench.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   start-up cost of 'import tidal_dl': wall time, slowest imports, deferred modules
+'''
+import os
+import sys
+import getopt
+import statistics
+import subprocess
+
+__ROOT__ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# imported on first use only, none of them should be loaded by 'import tidal_dl'
+__DEFERRED__ = ['tidal_dl.download', 'tidal_dl.server', 'lyricsgenius', 'Crypto', 'prettytable']
+
+__PROBE__ = '''
+import sys, time
+start = time.perf_counter()
+import tidal_dl
+print(time.perf_counter() - start)
+print(' '.join(name for name in %r if name in sys.modules))
+''' % (__DEFERRED__,)
+
+
+def __run__(args):
+    env = dict(os.environ, PYTHONPATH=__ROOT__ + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    return subprocess.run([sys.executable] + args, env=env, capture_output=True, text=True)
+
+
+def __getSlowest__(count):
+    '''Parse python -X importtime, Return: [(cumulative us, module)]'''
+    items = []
+    for line in __run__(['-X', 'importtime', '-c', 'import tidal_dl']).stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        items.append((int(parts[1]), parts[2].strip()))
+    return sorted(items, reverse=True)[:count]
+
+
+def main(argv):
+    opts, args = getopt.getopt(argv, "", ["runs="])
+    runs = int(dict(opts).get('--runs', 10))
+
+    times = []
+    loaded = ''
+    for _ in range(runs):
+        out = __run__(['-c', __PROBE__]).stdout.splitlines()
+        times.append(float(out[0]) * 1000)
+        loaded = out[1] if len(out) > 1 else ''
+    print("'import tidal_dl' over %d fresh processes: median %.0f ms, min %.0f ms"
+          % (runs, statistics.median(times), min(times)))
+    print('deferred modules loaded: ' + (loaded if loaded != '' else 'none'))
+    print('slowest imports (cumulative ms):')
+    for us, name in __getSlowest__(10):
+        print('%8.1f  %s' % (us / 1000, name))
+
+
+if __name__ == '__main__':
+    # python benchmarks/import_bench.py [--runs N]
+    main(sys.argv[1:])
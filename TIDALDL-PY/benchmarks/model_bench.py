@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   model_bench.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   decode of track dicts: model.dictToModel against aigpy's dictToModel, time and memory
+'''
+import os
+import sys
+import time
+import getopt
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import aigpy.modelHelper
+from tidal_dl.model import ModelBase, Track, dictToModel
+
+
+def __toAigpyClass__(cls, built):
+    '''The same model as the former aigpy classes: class attributes, nested fields are objects'''
+    if cls not in built:
+        attrs = {}
+        for name, default in cls.__fields__.items():
+            isModel = isinstance(default, type) and issubclass(default, ModelBase)
+            attrs[name] = __toAigpyClass__(default, built)() if isModel else default
+        built[cls] = type(cls.__name__, (aigpy.modelHelper.ModelBase,), attrs)
+    return built[cls]
+
+
+def __getTrackDict__(index):
+    '''A track of the playlists/{uuid}/items respond, with the keys no model reads'''
+    artist = {'id': 3346 + index % 50, 'name': 'Artist %d' % (index % 50), 'type': 'MAIN', 'picture': None}
+    return {'id': 1000000 + index, 'title': 'Track %d' % index, 'duration': 215, 'replayGain': -9.1, 'peak': 0.98,
+            'allowStreaming': True, 'streamReady': True, 'streamStartDate': '2018-01-01T00:00:00.000+0000',
+            'premiumStreamingOnly': False, 'trackNumber': index % 12 + 1, 'volumeNumber': 1, 'version': None,
+            'popularity': 41, 'copyright': '(P) 2018 Label', 'url': 'http://www.tidal.com/track/%d' % index,
+            'isrc': 'USABC18%05d' % index, 'editable': False, 'explicit': False, 'audioQuality': 'LOSSLESS',
+            'audioModes': ['STEREO'], 'artist': artist, 'artists': [artist],
+            'album': {'id': 2000000 + index // 12, 'title': 'Album %d' % (index // 12),
+                      'cover': '5e4d2a6f-4a55-4b0a-a3bc-1f3b0b2c%04d' % (index % 10000), 'videoCover': None},
+            'mixes': {'TRACK_MIX': '0011ab%08d' % index}}
+
+
+def __measure__(decode, items):
+    '''Return: (retained MB, peak MB) of the decoded models'''
+    tracemalloc.start()
+    models = [decode(item) for item in items]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del models
+    return current / 1024 / 1024, peak / 1024 / 1024
+
+
+def main(argv):
+    opts, args = getopt.getopt(argv, "", ["count="])
+    count = int(dict(opts).get('--count', 10000))
+    items = [__getTrackDict__(index) for index in range(count)]
+
+    oldTrack = __toAigpyClass__(Track, {})()
+    decoders = [('aigpy', lambda item: aigpy.modelHelper.dictToModel(item, oldTrack)),
+                ('model', lambda item: dictToModel(item, Track))]
+    print('%d track dicts' % count)
+    print('%-8s %10s %14s %12s' % ('decoder', 'seconds', 'retained MB', 'peak MB'))
+    for name, decode in decoders:
+        # timed without tracemalloc, it slows the allocations down
+        start = time.perf_counter()
+        [decode(item) for item in items]
+        seconds = time.perf_counter() - start
+        retained, peak = __measure__(decode, items)
+        print('%-8s %10.3f %14.1f %12.1f' % (name, seconds, retained, peak))
+
+
+if __name__ == '__main__':
+    # python benchmarks/model_bench.py [--count N]
+    main(sys.argv[1:])
@@ -10,8 +10,7 @@
 '''
 import logging
 import os
-import requests
-import prettytable
+import json
 import ssl
 import sys
 import getopt
@@ -24,9 +23,8 @@ from aigpy.systemHelper import cmpVersion
 from aigpy.cmdHelper import red, green, blue, yellow, TextColor
 
 from tidal_dl.tidal import TidalAPI
-from tidal_dl.settings import Settings, TokenSettings, getLogPath
+from tidal_dl.settings import Settings, TokenSettings, getLogPath, getVersionPath
 from tidal_dl.printf import Printf, VERSION
-from tidal_dl.download import start
 from tidal_dl.enum import AudioQuality, VideoQuality
 from tidal_dl.lang.language import getLang, setLang, initLang, getLangChoicePrint
 
@@ -41,6 +39,9 @@ logging.basicConfig(filename=getLogPath(),
                     level=logging.INFO,
                     format='%(asctime)s - %(levelname)s: %(message)s')
 
+# pypi is asked for the latest version once per this seconds
+__VERSION_CHECK_TTL__ = 24 * 3600
+
 
 def displayTime(seconds, granularity=2):
     if seconds <= 0:
@@ -65,6 +66,26 @@ def displayTime(seconds, granularity=2):
     return ', '.join(result[:granularity])
 
 
+def getOnlineVersion():
+    '''Get the latest version on pypi, cached in the settings folder for a day'''
+    path = getVersionPath()
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if 0 <= time.time() - data['time'] < __VERSION_CHECK_TTL__:
+            return data['version']
+    except:
+        pass
+    version = getLastVersion('tidal-dl')
+    if not isNull(version):
+        try:
+            with open(path, 'w') as f:
+                json.dump({'version': version, 'time': time.time()}, f)
+        except:
+            pass
+    return version
+
+
 def login():
     print(LANG.AUTH_START_LOGIN)
     msg, check = API.getDeviceCode()
@@ -124,6 +145,23 @@ def setAccessToken():
     TokenSettings.save(TOKEN)
 
 
+def refreshLogin():
+    '''Refresh the access token by the refresh token, without any prompt
+    - Return: (msg, check)
+    '''
+    if isNull(TOKEN.refreshToken):
+        return "Refresh failed. Please log in again.", False
+    msg, check = API.refreshAccessToken(TOKEN.refreshToken)
+    if check == False:
+        return msg, False
+    TOKEN.userid = API.key.userId
+    TOKEN.countryCode = API.key.countryCode
+    TOKEN.accessToken = API.key.accessToken
+    TOKEN.expiresAfter = time.time() + int(API.key.expiresIn)
+    TokenSettings.save(TOKEN)
+    return None, True
+
+
 def checkLogin():
     if not isNull(TOKEN.accessToken):
         # print('Checking Access Token...') #add to translations
@@ -133,14 +171,9 @@ def checkLogin():
             return
         else:
             Printf.info(LANG.MSG_INVAILD_ACCESSTOKEN)
-            msg, check = API.refreshAccessToken(TOKEN.refreshToken)
+            msg, check = refreshLogin()
             if check == True:
                 Printf.success(LANG.MSG_VALID_ACCESSTOKEN.format(displayTime(int(API.key.expiresIn))))
-                TOKEN.userid = API.key.userId
-                TOKEN.countryCode = API.key.countryCode
-                TOKEN.accessToken = API.key.accessToken
-                TOKEN.expiresAfter = time.time() + int(API.key.expiresIn)
-                TokenSettings.save(TOKEN)
                 return
             else:
                 Printf.err(msg)
@@ -188,15 +221,74 @@ def changeSettings():
     Settings.save(CONF)
 
 
+def serveCommand(argv):
+    try:
+        opts, args = getopt.getopt(argv, "", ["host=", "port=", "token="])
+    except getopt.GetoptError as errmsg:
+        Printf.err(vars(errmsg)['msg'] + ". Use 'tidal-dl -h' for useage.")
+        return
+
+    host, port, token = '127.0.0.1', 8765, None
+    for opt, val in opts:
+        if opt == '--host':
+            host = val
+        if opt == '--port':
+            port = int(val) if val.isdigit() else port
+        if opt == '--token':
+            token = val if not isNull(val) else None
+
+    checkLogin()
+    if not mkdirs(CONF.downloadPath):
+        Printf.err(LANG.MSG_PATH_ERR + CONF.downloadPath)
+        return
+    Printf.info(LANG.SETTING_DOWNLOAD_PATH + ':' + CONF.downloadPath)
+    from tidal_dl.server import serve
+    serve(TOKEN, CONF, host, port, refreshLogin, token)
+
+
+def syncCommand(argv):
+    try:
+        opts, args = getopt.getopt(argv, "", ["artist=", "playlist=", "prune"])
+    except getopt.GetoptError as errmsg:
+        Printf.err(vars(errmsg)['msg'] + ". Use 'tidal-dl -h' for useage.")
+        return
+
+    artists = [val for opt, val in opts if opt == '--artist']
+    playlists = [val for opt, val in opts if opt == '--playlist']
+    prune = any(opt == '--prune' for opt, val in opts)
+    if len(artists) + len(playlists) <= 0:
+        Printf.err("Please enter something. Use 'tidal-dl -h' for useage.")
+        return
+
+    checkLogin()
+    if not mkdirs(CONF.downloadPath):
+        Printf.err(LANG.MSG_PATH_ERR + CONF.downloadPath)
+        return
+    from tidal_dl.sync import syncArtist, syncPlaylist
+    Printf.info(LANG.SETTING_DOWNLOAD_PATH + ':' + CONF.downloadPath)
+    for item in artists:
+        syncArtist(TOKEN, CONF, item)
+    for item in playlists:
+        syncPlaylist(TOKEN, CONF, item, prune)
+
+
 def mainCommand():
+    if sys.argv[1] == 'serve':
+        serveCommand(sys.argv[2:])
+        return
+    if sys.argv[1] == 'sync':
+        syncCommand(sys.argv[2:])
+        return
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "hvl:o:q:r:", ["help", "version",
-                                                                "link=", "output=", "quality", "resolution"])
+        opts, args = getopt.getopt(sys.argv[1:], "hvl:o:q:r:j:b:", ["help", "version",
+                                                                    "link=", "output=", "quality", "resolution", "jobs=",
+                                                                    "batch=", "no-cache", "refresh"])
     except getopt.GetoptError as errmsg:
         Printf.err(vars(errmsg)['msg'] + ". Use 'tidal-dl -h' for useage.")
         return
 
     link = None
+    resultPath = None
     for opt, val in opts:
         if opt in ('-h', '--help'):
             Printf.usage()
@@ -220,14 +312,35 @@ def mainCommand():
             CONF.videoQuality = Settings.getVideoQuality(val)
             Settings.save(CONF)
             continue
+        if opt in ('-j', '--jobs'):
+            CONF.threadNum = Settings.getThreadNum(val)
+            CONF.multiThreadDownload = CONF.threadNum > 1
+            Settings.save(CONF)
+            continue
+        if opt in ('-b', '--batch'):
+            resultPath = val
+            continue
+        if opt == '--no-cache':
+            from tidal_dl.download import setCacheMode
+            setCacheMode(enable=False)
+            continue
+        if opt == '--refresh':
+            from tidal_dl.download import setCacheMode
+            setCacheMode(enable=True, refresh=True)
+            continue
 
     if not mkdirs(CONF.downloadPath):
         Printf.err(LANG.MSG_PATH_ERR + CONF.downloadPath)
         return
 
     if link is not None:
+        # the download modules are only imported by the commands that download
+        from tidal_dl.download import start, batch
         Printf.info(LANG.SETTING_DOWNLOAD_PATH + ':' + CONF.downloadPath)
-        start(TOKEN, CONF, link)
+        if resultPath is not None:
+            batch(TOKEN, CONF, link, resultPath)
+        else:
+            start(TOKEN, CONF, link)
 
 
 def main():
@@ -235,12 +348,13 @@ def main():
         mainCommand()
         return
 
+    from tidal_dl.download import start
     Printf.logo()
     Printf.settings(CONF)
 
     checkLogin()
 
-    onlineVer = getLastVersion('tidal-dl')
+    onlineVer = getOnlineVersion()
     if not isNull(onlineVer):
         icmp = cmpVersion(onlineVer, VERSION)
         if icmp > 0:
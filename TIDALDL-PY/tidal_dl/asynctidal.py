@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   asynctidal.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   asyncio facade of the tidal api
+'''
+import asyncio
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+from tidal_dl.tidal import TidalAPI
+from tidal_dl.enum import Type, AudioQuality, VideoQuality
+
+
+class AsyncTidalAPI(object):
+    '''Awaitable methods of TidalAPI for asyncio callers.
+    This is not an async transport: each call runs the blocking TidalAPI method on a thread,
+    over the pooled session of the wrapped api (same login key, caches, rate limiter and connections).
+    - at most threadNum calls are in flight, the default is the connection pool size of the api.
+      More threads than pooled connections only open new tls connections that the pool discards
+    - a listing (getItems/getArtistAlbums) requests its pages on up to api.pageThreadNum more threads
+    '''
+
+    def __init__(self, api: TidalAPI = None, threadNum=None):
+        self.api = api if api is not None else TidalAPI()
+        self.key = self.api.key
+        self.threadNum = threadNum if threadNum is not None else self.api.poolSize
+        self.__pool = ThreadPoolExecutor(max_workers=self.threadNum)
+
+    async def __run__(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.__pool, functools.partial(func, *args, **kwargs))
+
+    async def getAlbum(self, id):
+        return await self.__run__(self.api.getAlbum, id)
+
+    async def getTrack(self, id):
+        return await self.__run__(self.api.getTrack, id)
+
+    async def getItems(self, id, type: Type, refresh=False):
+        return await self.__run__(self.api.getItems, id, type, refresh)
+
+    async def getStreamUrl(self, id, quality: AudioQuality):
+        return await self.__run__(self.api.getStreamUrl, id, quality)
+
+    async def getVideoStreamUrl(self, id, quality: VideoQuality):
+        return await self.__run__(self.api.getVideoStreamUrl, id, quality)
+
+    async def getTrackContributors(self, id):
+        return await self.__run__(self.api.getTrackContributors, id)
+
+    async def getArtistAlbums(self, id, includeEP=False, refresh=False):
+        return await self.__run__(self.api.getArtistAlbums, id, includeEP, refresh)
+
+    async def getByString(self, string):
+        return await self.__run__(self.api.getByString, string)
+
+    def close(self):
+        self.__pool.shutdown(wait=False)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   cache.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   in-process and on-disk caches
+'''
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    '''Thread safe LRU cache, the items expire after ttl seconds (ttl <= 0 never expire)'''
+
+    def __init__(self, maxSize=256, ttl=3600):
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.__items = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.__lock:
+            if key not in self.__items:
+                return default
+            value, expireTime = self.__items[key]
+            if expireTime is not None and expireTime < time.time():
+                del self.__items[key]
+                return default
+            self.__items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expireTime = time.time() + self.ttl if self.ttl > 0 else None
+        with self.__lock:
+            self.__items[key] = (value, expireTime)
+            self.__items.move_to_end(key)
+            while len(self.__items) > self.maxSize:
+                self.__items.popitem(last=False)
+
+    def remove(self, key):
+        with self.__lock:
+            self.__items.pop(key, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__items.clear()
+
+    def __len__(self):
+        return len(self.__items)
+
+
+class DiskCache(object):
+    '''Key/text cache in a sqlite file, the least recently used entries are evicted
+    when the total size is over maxSize bytes. The ttl is given by each get.
+    '''
+
+    def __init__(self, path, maxSize=200 * 1024 * 1024):
+        self.path = path
+        self.maxSize = maxSize
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(path, check_same_thread=False)
+        with self.__lock, self.__conn:
+            self.__conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                                "key TEXT PRIMARY KEY, time REAL, access REAL, size INTEGER, data TEXT)")
+            self.__size = self.__conn.execute("SELECT IFNULL(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key, ttl):
+        with self.__lock, self.__conn:
+            row = self.__conn.execute("SELECT time, data FROM entries WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            if ttl > 0 and row[0] + ttl < time.time():
+                return None
+            self.__conn.execute("UPDATE entries SET access=? WHERE key=?", (time.time(), key))
+            return row[1]
+
+    def set(self, key, value):
+        size = len(value)
+        now = time.time()
+        with self.__lock, self.__conn:
+            row = self.__conn.execute("SELECT size FROM entries WHERE key=?", (key,)).fetchone()
+            if row is not None:
+                self.__size -= row[0]
+            self.__conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (key, now, now, size, value))
+            self.__size += size
+            if self.__size > self.maxSize:
+                self.__evict__(self.maxSize * 0.9)
+
+    def __evict__(self, targetSize):
+        rows = self.__conn.execute("SELECT key, size FROM entries ORDER BY access").fetchall()
+        keys = []
+        for key, size in rows:
+            if self.__size <= targetSize:
+                break
+            keys.append((key,))
+            self.__size -= size
+        self.__conn.executemany("DELETE FROM entries WHERE key=?", keys)
+
+    def clear(self):
+        with self.__lock, self.__conn:
+            self.__conn.execute("DELETE FROM entries")
+            self.__size = 0
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+
+class ImageCache(object):
+    '''Image bytes by key (see getKey), in memory and in a folder on disk.
+    - the files are named by the sha1 of their content, the keys of the same image share one file
+    - the least recently used images are evicted when the bytes are over memorySize/maxSize
+    '''
+
+    def __init__(self, path, maxSize=500 * 1024 * 1024, memorySize=64 * 1024 * 1024):
+        self.path = path
+        self.maxSize = maxSize
+        self.memorySize = memorySize
+        self.__memory = OrderedDict()
+        self.__memoryBytes = 0
+        self.__lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.__conn = sqlite3.connect(os.path.join(path, 'index.db'), check_same_thread=False)
+        with self.__lock, self.__conn:
+            self.__conn.execute("CREATE TABLE IF NOT EXISTS images ("
+                                "key TEXT PRIMARY KEY, hash TEXT, size INTEGER, access REAL)")
+            self.__size = self.__conn.execute("SELECT IFNULL(SUM(size), 0) FROM "
+                                              "(SELECT MAX(size) AS size FROM images GROUP BY hash)").fetchone()[0]
+
+    @staticmethod
+    def getKey(uuid, width, height):
+        return str(uuid) + '-' + str(width) + 'x' + str(height)
+
+    def __getFilePath__(self, digest):
+        return os.path.join(self.path, digest + '.jpg')
+
+    def __remember__(self, key, data):
+        if key in self.__memory:
+            self.__memoryBytes -= len(self.__memory.pop(key))
+        self.__memory[key] = data
+        self.__memoryBytes += len(data)
+        while self.__memoryBytes > self.memorySize and len(self.__memory) > 0:
+            self.__memoryBytes -= len(self.__memory.popitem(last=False)[1])
+
+    def __release__(self, digest, size):
+        '''Remove the file of the digest when no key uses it'''
+        if self.__conn.execute("SELECT 1 FROM images WHERE hash=?", (digest,)).fetchone() is not None:
+            return
+        try:
+            os.remove(self.__getFilePath__(digest))
+        except OSError:
+            pass
+        self.__size -= size
+
+    def get(self, key):
+        with self.__lock:
+            if key in self.__memory:
+                self.__memory.move_to_end(key)
+                return self.__memory[key]
+            with self.__conn:
+                row = self.__conn.execute("SELECT hash, size FROM images WHERE key=?", (key,)).fetchone()
+                if row is None:
+                    return None
+                try:
+                    with open(self.__getFilePath__(row[0]), 'rb') as f:
+                        data = f.read()
+                except OSError:
+                    self.__conn.execute("DELETE FROM images WHERE key=?", (key,))
+                    self.__release__(row[0], row[1])
+                    return None
+                self.__conn.execute("UPDATE images SET access=? WHERE key=?", (time.time(), key))
+            self.__remember__(key, data)
+            return data
+
+    def set(self, key, data):
+        digest = hashlib.sha1(data).hexdigest()
+        with self.__lock, self.__conn:
+            path = self.__getFilePath__(digest)
+            if not os.path.isfile(path):
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(data)
+                os.replace(path + '.tmp', path)
+                self.__size += len(data)
+            old = self.__conn.execute("SELECT hash, size FROM images WHERE key=?", (key,)).fetchone()
+            self.__conn.execute("INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?)", (key, digest, len(data), time.time()))
+            if old is not None and old[0] != digest:
+                self.__release__(old[0], old[1])
+            self.__remember__(key, data)
+            if self.__size > self.maxSize:
+                self.__evict__(self.maxSize * 0.9)
+
+    def __evict__(self, targetSize):
+        rows = self.__conn.execute("SELECT key, hash, size FROM images ORDER BY access").fetchall()
+        for key, digest, size in rows:
+            if self.__size <= targetSize:
+                break
+            self.__conn.execute("DELETE FROM images WHERE key=?", (key,))
+            self.__release__(digest, size)
+            if key in self.__memory:
+                self.__memoryBytes -= len(self.__memory.pop(key))
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
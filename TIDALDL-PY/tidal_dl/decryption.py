@@ -10,8 +10,8 @@
 '''
 import base64
 
-from Crypto.Cipher import AES
-from Crypto.Util import Counter
+# bytes read/decrypted/written per step, bounds the memory used by decrypt_file
+DEFAULT_CHUNK_SIZE = 1024 * 1024
 
 
 def decrypt_security_token(security_token):
@@ -21,6 +21,8 @@ def decrypt_security_token(security_token):
     security_token should match the securityToken value from the web response
     '''
 
+    from Crypto.Cipher import AES
+
     # Do not change this
     master_key = 'UIlTTEMmmLfGowo/UC60x2H45W6MdGgTRfo/umg4754='
 
@@ -45,19 +47,36 @@ def decrypt_security_token(security_token):
     return key, nonce
 
 
-def decrypt_file(efile, dfile, key, nonce):
+def create_decryptor(key, nonce, offset=0):
     '''
-    Decrypts an encrypted MQA file given the file, key and nonce
+    Creates an AES-CTR decryptor positioned at the byte offset of the stream
     '''
 
-    # Initialize counter and file decryptor
-    counter = Counter.new(64, prefix=nonce, initial_value=0)
+    from Crypto.Cipher import AES
+    from Crypto.Util import Counter
+
+    # Each 16 bytes block has its own counter, skip the blocks before the offset
+    counter = Counter.new(64, prefix=nonce, initial_value=offset // 16)
     decryptor = AES.new(key, AES.MODE_CTR, counter=counter)
 
-    # Open and decrypt
-    with open(efile, 'rb') as eflac:
-        flac = decryptor.decrypt(eflac.read())
+    # Drop the keystream of the bytes before the offset inside the first block
+    if offset % 16 != 0:
+        decryptor.decrypt(bytes(offset % 16))
+    return decryptor
+
 
-        # Replace with decrypted file
-        with open(dfile, 'wb') as dflac:
-            dflac.write(flac)
+def decrypt_file(efile, dfile, key, nonce, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''
+    Decrypts an encrypted MQA file given the file, key and nonce
+    '''
+
+    # Initialize counter and file decryptor
+    decryptor = create_decryptor(key, nonce)
+
+    # Open and decrypt chunk by chunk
+    with open(efile, 'rb') as eflac, open(dfile, 'wb') as dflac:
+        while True:
+            chunk = eflac.read(chunk_size)
+            if not chunk:
+                break
+            dflac.write(decryptor.decrypt(chunk))
@@ -9,19 +9,50 @@
 @Desc    :   
 '''
 import os
+import re
+import json
+import time
 import aigpy
 import logging
-import lyricsgenius
+import threading
 
-from tidal_dl.settings import Settings
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError
+from mutagen import flac, mp4
+from mutagen.id3 import APIC
+
+from tidal_dl.settings import Settings, getCachePath, getImageCachePath, getLyricsCachePath
 from tidal_dl.tidal import TidalAPI
 from tidal_dl.enum import Type, AudioQuality, VideoQuality
 from tidal_dl.model import Track, Video, Album
 from tidal_dl.printf import Printf
 from tidal_dl.decryption import decrypt_security_token
-from tidal_dl.decryption import decrypt_file
+from tidal_dl.transfer import downloadStream, getRemoteSize
+from tidal_dl import hls
+from tidal_dl.index import DownloadIndex
+from tidal_dl.cache import DiskCache, ImageCache
 
 API = TidalAPI()
+INDEX = None
+INDEX_LOCK = threading.Lock()
+IMAGES = None
+LYRICS = None
+# striped locks, one download per image key at a time
+IMAGE_LOCKS = [threading.Lock() for _ in range(16)]
+# command line switches of the metadata cache
+CACHE_ENABLE = True
+CACHE_REFRESH = False
+# a prefetched stream url is requested again when it expires within this seconds
+STREAM_URL_MARGIN = 60
+# life of a stream url that does not tell its expiry
+STREAM_URL_TTL = 600
+# number of tracks tagged at the same time
+TAG_THREAD_NUM = 2
+# number of contributors/lyrics requests of an album at the same time
+ENRICH_THREAD_NUM = 4
+# seconds the tagging of an album waits for the lyrics in total, then it goes on without them
+LYRICS_BUDGET = 30
+# the lyrics (and the lack of them) are cached this seconds
+LYRICS_CACHE_TTL = 30 * 86400
 
 
 def __loadAPI__(user):
@@ -31,6 +62,23 @@ def __loadAPI__(user):
     #API.key.sessionId = user.sessionid1
 
 
+def setCacheMode(enable=True, refresh=False):
+    global CACHE_ENABLE, CACHE_REFRESH
+    CACHE_ENABLE = enable
+    CACHE_REFRESH = refresh
+
+
+def __loadCache__(conf):
+    if not conf.useCache or not CACHE_ENABLE:
+        API.setDiskCache(None)
+        return
+    cache = API.diskCache
+    if cache is None:
+        cache = DiskCache(getCachePath())
+    cache.maxSize = conf.cacheMaxSize * 1024 * 1024
+    API.setDiskCache(cache, CACHE_REFRESH)
+
+
 def __loadVideoAPI__(user):
     API.key.accessToken = user.accessToken
     API.key.userId = user.userid
@@ -73,22 +121,81 @@ def __parseContributors__(roleType, Contributors):
         return None
 
 
-GEMIUS = lyricsgenius.Genius('vNKbAWAE3rVY_48nRaiOrDcWNLvsxS-Z8qyG5XfEzTOtZvkTfg6P3pxOVlA2BjaW')
+GEMIUS = None
+GEMIUS_LOCK = threading.Lock()
+
+
+def __getGenius__():
+    # lyricsgenius (and bs4) is only imported when the lyrics are wanted
+    global GEMIUS
+    with GEMIUS_LOCK:
+        if GEMIUS is None:
+            import lyricsgenius
+            GEMIUS = lyricsgenius.Genius('vNKbAWAE3rVY_48nRaiOrDcWNLvsxS-Z8qyG5XfEzTOtZvkTfg6P3pxOVlA2BjaW')
+            # the searches run on the enrich workers, their progress lines would mix up the output
+            GEMIUS.verbose = False
+        return GEMIUS
+
+
+def __getLyricsCache__():
+    global LYRICS
+    with INDEX_LOCK:
+        if LYRICS is None:
+            LYRICS = DiskCache(getLyricsCachePath())
+    return LYRICS
+
+
+def __searchLyrics__(trackName, artistName, proxy):
+    '''Return: the lyrics, '' if there are none. Raise if the search failed'''
+    genius = __getGenius__()
+    if not aigpy.string.isNull(proxy):
+        genius._session.proxies = {
+            'http': f'http://{proxy}',
+            'https': f'http://{proxy}',
+        }
+    song = genius.search_song(trackName, artistName)
+    return song.lyrics if song is not None and song.lyrics is not None else ""
+
+
 def __getLyrics__(trackName, artistName, proxy):
+    key = str(artistName).strip().lower() + '\n' + str(trackName).strip().lower()
     try:
-        if not aigpy.string.isNull(proxy):
-            GEMIUS._session.proxies = {
-                'http': f'http://{proxy}',
-                'https': f'http://{proxy}',
-            }
-        
-        song = GEMIUS.search_song(trackName, artistName)
-        return song.lyrics
-    except:
+        lyrics = __getLyricsCache__().get(key, LYRICS_CACHE_TTL)
+        if lyrics is not None:
+            return lyrics
+        lyrics = __searchLyrics__(trackName, artistName, proxy)
+        __getLyricsCache__().set(key, lyrics)
+        return lyrics
+    except Exception as e:
+        logging.info("[Lyrics] " + str(e))
         return ""
 
-def __setMetaData__(track, album, filepath, contributors, lyrics):
-    obj = aigpy.tag.TagTool(filepath)
+
+def __getContributors__(id):
+    msg, contributors = API.getTrackContributors(id)
+    return contributors
+
+class __TagTool__(aigpy.tag.TagTool):
+    '''TagTool that also takes the cover as bytes, so it is not downloaded again for each track'''
+
+    def __savePic__(self, coverPath):
+        if not isinstance(coverPath, bytes):
+            return super().__savePic__(coverPath)
+        if 'flac' in self._ext:
+            pic = flac.Picture()
+            pic.data = coverPath
+            pic.mime = u"image/jpeg"
+            self._handle.clear_pictures()
+            self._handle.add_picture(pic)
+        if 'mp3' in self._ext:
+            self._handle.tags.add(APIC(encoding=3, data=coverPath))
+        if 'mp4' in self._ext or 'm4a' in self._ext:
+            self._handle.tags['covr'] = [mp4.MP4Cover(coverPath)]
+
+
+def __setMetaData__(track, album, filepath, contributors, lyrics, cover=None):
+    '''cover: the image bytes, None to let the tagger download it'''
+    obj = __TagTool__(filepath)
     obj.album = track.album.title
     obj.title = track.title
     if not aigpy.string.isNull(track.version):
@@ -105,8 +212,9 @@ def __setMetaData__(track, album, filepath, contributors, lyrics):
     obj.lyrics = lyrics
     if obj.totaldisc <= 1:
         obj.totaltrack = album.numberOfTracks
-    coverpath = API.getCoverUrl(album.cover, "1280", "1280")
-    obj.save(coverpath)
+    if cover is None:
+        cover = API.getCoverUrl(album.cover, "1280", "1280")
+    obj.save(cover)
     return
 
 def __convertToM4a__(filepath, codec):
@@ -165,6 +273,44 @@ def __getAlbumPath__(conf: Settings, album):
     return base + retpath
 
 
+def __getIndex__():
+    global INDEX
+    with INDEX_LOCK:
+        if INDEX is None:
+            INDEX = DownloadIndex()
+    return INDEX
+
+
+def __getImageCache__():
+    global IMAGES
+    with INDEX_LOCK:
+        if IMAGES is None:
+            IMAGES = ImageCache(getImageCachePath())
+    return IMAGES
+
+
+def __getCoverData__(cover, width="1280", height="1280"):
+    '''Get the bytes of a cover image by the image cache, None if it can not be downloaded'''
+    url = API.getCoverUrl(cover, width, height)
+    if url is None:
+        return None
+    cache = __getImageCache__()
+    key = cache.getKey(cover, width, height)
+    with IMAGE_LOCKS[hash(key) % len(IMAGE_LOCKS)]:
+        data = cache.get(key)
+        if data is not None:
+            return data
+        try:
+            respond = API.cdnSession.get(url, timeout=(5.05, 30))
+            respond.raise_for_status()
+            data = respond.content
+        except Exception as e:
+            logging.error("[DL Cover] url=" + url + ". err=" + str(e))
+            return None
+        cache.set(key, data)
+        return data
+
+
 def __getAlbumPath2__(conf, album):
     # outputdir/Album/artist/
     artist = aigpy.path.replaceLimitChar(album.artists[0].name, '-').strip()
@@ -224,8 +370,8 @@ def __getTrackPath__(conf: Settings, track, stream, album=None, playlist=None):
     year = ""
     if album.releaseDate is not None:
         year = aigpy.string.getSubOnlyEnd(album.releaseDate, '-')
-    # extension
-    extension = __getExtension__(stream.url)
+    # extension, without a stream the path is returned without it
+    extension = __getExtension__(stream.url) if stream is not None else ''
     retpath = conf.trackFileFormat
     if retpath is None or len(retpath) <= 0:
         retpath = Settings.getDefaultTrackFileFormat()
@@ -302,7 +448,7 @@ def __isNeedDownload__(path, url):
     curSize = aigpy.file.getSize(path)
     if curSize <= 0:
         return True
-    netSize = aigpy.net.getSize(url)
+    netSize = getRemoteSize(API.cdnSession, url)
     if curSize >= netSize:
         return False
     return True
@@ -311,76 +457,113 @@ def __isNeedDownload__(path, url):
 def __downloadVideo__(conf, video:Video, album=None, playlist=None):
     if video.allowStreaming is False:
         Printf.err("Download failed! " + video.title + ' not allow streaming.')
-        return
+        return False
 
     msg, stream = API.getVideoStreamUrl(video.id, conf.videoQuality)
     Printf.video(video, stream)
     if not aigpy.string.isNull(msg):
         Printf.err(video.title + "." + msg)
-        return
+        return False
     path = __getVideoPath__(conf, video, album, playlist)
 
     logging.info("[DL Video] name=" + aigpy.path.getFileName(path) + "\nurl=" + stream.m3u8Url)
-    check, msg = aigpy.m3u8.download(stream.m3u8Url, path)
+    identity = str(video.id) + '-' + str(stream.resolution)
+    check, msg = hls.download(API.cdnSession, stream.m3u8Url, path,
+                              showProgress=conf.showProgress and not Printf.isCapturing(), identity=identity)
     if check is True:
         Printf.success(aigpy.path.getFileName(path))
-    else:
-        Printf.err("\nDownload failed!" + msg + '(' + aigpy.path.getFileName(path) + ')')
+        return True
+    Printf.err("\nDownload failed!" + msg + '(' + aigpy.path.getFileName(path) + ')')
+    return False
 
 
-def __downloadTrack__(conf: Settings, track:Track, album=None, playlist=None):
+def __tagTrack__(conf, track, album, path, codec, trackFormat, enricher=None):
+    '''Convert, tag and index a downloaded track, Return: True if done'''
+    try:
+        path = __convertToM4a__(path, codec)
+        cover = __getCoverData__(album.cover) if album is not None else None
+
+        # contributors
+        if enricher is not None:
+            contributors, lyrics = enricher.get(track)
+        else:
+            contributors = __getContributors__(track.id)
+            lyrics = ''
+            if conf.addLyrics:
+                lyrics = __getLyrics__(track.title, track.artists[0].name, conf.lyricsServerProxy)
+
+        __setMetaData__(track, album, path, contributors, lyrics, cover)
+        __getIndex__().add(track.id, conf.audioQuality.name, trackFormat, path)
+        Printf.success(aigpy.path.getFileName(path))
+        return True
+    except Exception as e:
+        Printf.err("Download failed! " + track.title + ' (' + str(e) + ')')
+        return False
+
+
+def __downloadTrack__(conf: Settings, track:Track, album=None, playlist=None, prefetcher=None, tagger=None):
+    '''Return: True if done, or the Future of the tagging when tagger is set'''
     try:
         if track.allowStreaming is False:
             Printf.err("Download failed! " + track.title + ' not allow streaming.')
-            return
-
-        msg, stream = API.getStreamUrl(track.id, conf.audioQuality)
+            return False
+
+        # check the local index before any request
+        trackFormat = __getTrackPath__(conf, track, None, album, playlist)
+        if conf.checkExist:
+            path = __getIndex__().find(track.id, conf.audioQuality.name, trackFormat)
+            if path is not None:
+                Printf.track(track)
+                Printf.success(aigpy.path.getFileName(path) + " (skip:already exists!)")
+                return True
+
+        if prefetcher is not None:
+            msg, stream = prefetcher.get(track)
+        else:
+            msg, stream = API.getStreamUrl(track.id, conf.audioQuality)
         Printf.track(track, stream)
         if not aigpy.string.isNull(msg) or stream is None:
             Printf.err(track.title + "." + msg)
-            return
+            return False
         path = __getTrackPath__(conf, track, stream, album, playlist)
 
         # check exist
         if conf.checkExist and __isNeedDownload__(path, stream.url) == False:
+            __getIndex__().add(track.id, conf.audioQuality.name, trackFormat, path)
             Printf.success(aigpy.path.getFileName(path) + " (skip:already exists!)")
-            return
+            return True
         logging.info("[DL Track] name=" + aigpy.path.getFileName(path) + "\nurl=" + stream.url)
-        tool = aigpy.download.DownloadTool(path + '.part', [stream.url])
-        check, err = tool.start(conf.showProgress)
-
+        # encrypted -> decrypt while downloading
+        key, nonce = None, None
+        if not aigpy.string.isNull(stream.encryptionKey):
+            key, nonce = decrypt_security_token(stream.encryptionKey)
+        # the same track and quality resumes from an unfinished .part file
+        identity = str(track.id) + '-' + str(stream.soundQuality) + '-' + str(stream.codec)
+        check, err = downloadStream(API.cdnSession, stream.url, path + '.part', key, nonce,
+                                    showProgress=conf.showProgress and not Printf.isCapturing(),
+                                    identity=identity, segmentNum=conf.segmentNum)
         if not check:
             Printf.err("Download failed! " + aigpy.path.getFileName(path) + ' (' + str(err) + ')')
-            return
-        # encrypted -> decrypt and remove encrypted file
-        if aigpy.string.isNull(stream.encryptionKey):
-            os.replace(path + '.part', path)
-        else:
-            key, nonce = decrypt_security_token(stream.encryptionKey)
-            decrypt_file(path + '.part', path, key, nonce)
-            os.remove(path + '.part')
+            return False
+        os.replace(path + '.part', path)
 
-        path = __convertToM4a__(path, stream.codec)
-
-        # contributors
-        contributors = API.getTrackContributors(track.id)
-        lyrics = ''
-        if conf.addLyrics:
-            lyrics = __getLyrics__(track.title, track.artists[0].name, conf.lyricsServerProxy)
-            
-        __setMetaData__(track, album, path, contributors, lyrics)
-        Printf.success(aigpy.path.getFileName(path))
+        if tagger is not None:
+            return tagger.submit(track, album, path, stream.codec, trackFormat)
+        return __tagTrack__(conf, track, album, path, stream.codec, trackFormat)
     except Exception as e:
         Printf.err("Download failed! " + track.title + ' (' + str(e) + ')')
+        return False
 
 
 def __downloadCover__(conf, album):
     if album == None:
         return
     path = __getAlbumPath__(conf, album) + '/cover.jpg'
-    url = API.getCoverUrl(album.cover, "1280", "1280")
-    if url is not None:
-        aigpy.net.downloadFile(url, path)
+    data = __getCoverData__(album.cover)
+    if data is not None:
+        aigpy.path.mkdirs(aigpy.path.getDirName(path))
+        with open(path, 'wb') as f:
+            f.write(data)
 
 def __saveAlbumInfo__(conf, album, tracks):
     if album == None:
@@ -410,20 +593,240 @@ def __saveAlbumInfo__(conf, album, tracks):
     aigpy.file.write(path, infos, "w+")
 
 
+def __isStreamUrlExpired__(url, fetchTime):
+    match = re.search(r'(?:exp|expires|Expires)=(\d{10})', url or '')
+    expires = int(match.group(1)) if match else fetchTime + STREAM_URL_TTL
+    return expires - time.time() < STREAM_URL_MARGIN
+
+
+def __isTrackSkipped__(conf, track, album, playlist):
+    '''True if the track will not be downloaded: not streamable or already in the index'''
+    if track.allowStreaming is False:
+        return True
+    if not conf.checkExist:
+        return False
+    trackFormat = __getTrackPath__(conf, track, None, album, playlist)
+    return __getIndex__().find(track.id, conf.audioQuality.name, trackFormat) is not None
+
+
+class __StreamPrefetcher__(object):
+    '''Request the stream urls of the next tracks while the current ones download.
+    - the tracks already in the download index are not requested
+    - a url that failed or is about to expire is requested again by get
+    '''
+
+    def __init__(self, conf, tasks, num):
+        self.conf = conf
+        self.tasks = tasks
+        self.num = num
+        self.next = 0
+        self.futures = {}
+        self.positions = {}
+        for index, (track, album, playlist) in enumerate(tasks):
+            self.positions.setdefault(track.id, index)
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=min(num, 4)) if num > 0 else None
+
+    def __fetch__(self, track):
+        msg, stream = API.getStreamUrl(track.id, self.conf.audioQuality)
+        return time.time(), msg, stream
+
+    def __advance__(self, index):
+        self.next = max(self.next, index + 1)
+        end = min(len(self.tasks), index + 1 + self.num)
+        while self.next < end:
+            track, album, playlist = self.tasks[self.next]
+            self.next += 1
+            if track.id in self.futures:
+                continue
+            try:
+                if __isTrackSkipped__(self.conf, track, album, playlist):
+                    continue
+            except Exception as e:
+                # not prefetched, the download of that track reports the error
+                logging.info("[Prefetch] " + str(e))
+                continue
+            self.futures[track.id] = self.pool.submit(self.__fetch__, track)
+
+    def get(self, track):
+        '''Return: (msg, stream) like API.getStreamUrl'''
+        future = None
+        if self.pool is not None:
+            with self.lock:
+                future = self.futures.pop(track.id, None)
+                self.__advance__(self.positions.get(track.id, -1))
+        if future is not None:
+            try:
+                fetchTime, msg, stream = future.result()
+                if aigpy.string.isNull(msg) and stream is not None \
+                        and not __isStreamUrlExpired__(stream.url, fetchTime):
+                    return msg, stream
+            except Exception as e:
+                logging.info("[Prefetch] " + str(e))
+        return API.getStreamUrl(track.id, self.conf.audioQuality)
+
+    def close(self):
+        if self.pool is None:
+            return
+        with self.lock:
+            for future in self.futures.values():
+                future.cancel()
+            self.futures.clear()
+        self.pool.shutdown(wait=False)
+
+
+class __EnrichStage__(object):
+    '''Fetch the contributors (and lyrics) of all the tracks concurrently, ahead of the tagging.
+    The tagging waits LYRICS_BUDGET seconds in total for the lyrics of the album, the tracks
+    after that get the lyrics that are ready or none. The late ones still go into the lyrics cache.
+    '''
+
+    def __init__(self, conf, tasks):
+        self.conf = conf
+        self.budget = LYRICS_BUDGET
+        self.lock = threading.Lock()
+        self.contributors = {}
+        self.lyrics = {}
+        self.pool = ThreadPoolExecutor(max_workers=ENRICH_THREAD_NUM)
+        self.lyricsPool = ThreadPoolExecutor(max_workers=ENRICH_THREAD_NUM) if conf.addLyrics else None
+        for track, album, playlist in tasks:
+            if track.id in self.contributors:
+                continue
+            try:
+                if __isTrackSkipped__(conf, track, album, playlist):
+                    continue
+            except Exception as e:
+                # e.g. the album of the track is unknown, the download of the track reports it
+                logging.info("[Enrich] " + str(e))
+                continue
+            self.contributors[track.id] = self.pool.submit(__getContributors__, track.id)
+            if self.lyricsPool is not None:
+                self.lyrics[track.id] = self.lyricsPool.submit(__getLyrics__, track.title, track.artists[0].name,
+                                                               conf.lyricsServerProxy)
+
+    def __waitLyrics__(self, future):
+        begin = time.monotonic()
+        try:
+            return future.result(timeout=max(0, self.budget))
+        except TimeoutError:
+            return ""
+        finally:
+            with self.lock:
+                self.budget -= time.monotonic() - begin
+
+    def get(self, track):
+        '''Return: (contributors, lyrics)'''
+        future = self.contributors.get(track.id)
+        contributors = future.result() if future is not None else __getContributors__(track.id)
+        lyrics = ''
+        if self.conf.addLyrics:
+            future = self.lyrics.get(track.id)
+            if future is not None:
+                lyrics = self.__waitLyrics__(future)
+            elif self.budget > 0:
+                lyrics = __getLyrics__(track.title, track.artists[0].name, self.conf.lyricsServerProxy)
+        return contributors, lyrics
+
+    def close(self):
+        for future in list(self.contributors.values()) + list(self.lyrics.values()):
+            future.cancel()
+        self.pool.shutdown(wait=False)
+        if self.lyricsPool is not None:
+            self.lyricsPool.shutdown(wait=False)
+
+
+class __TagStage__(object):
+    '''Convert/tag/index the downloaded tracks on its own pool, the download workers
+    go on with the next transfer while mutagen rewrites the files.
+    The cover of an album is fetched once (image cache) and embedded from memory.
+    '''
+
+    def __init__(self, conf, threadNum, enricher=None):
+        self.conf = conf
+        self.enricher = enricher
+        self.pool = ThreadPoolExecutor(max_workers=threadNum)
+
+    def submit(self, track, album, path, codec, trackFormat):
+        '''Return: Future of (check, lines)'''
+        return self.pool.submit(__runTask__, __tagTrack__, self.conf, track, album, path, codec, trackFormat,
+                                self.enricher)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+def __collectResult__(check):
+    '''Wait for the result of __downloadTrack__ (bool or tagging Future) and print its output
+    - Return: 1 if the track failed, else 0
+    '''
+    if isinstance(check, Future):
+        check, lines = check.result()
+        Printf.flush(lines)
+    return 0 if check else 1
+
+
+def __runTask__(func, *args):
+    '''Return: (result, lines), result is None if func raised'''
+    Printf.startCapture()
+    ret = None
+    try:
+        ret = func(*args)
+    except Exception as e:
+        Printf.err(str(e))
+    return ret, Printf.stopCapture()
+
+
+def __downloadTracks__(conf, tasks):
+    '''Download tracks by the worker pool, tasks: [(track, album, playlist)]
+    - the output of each track is buffered and printed in the order of the tasks
+    - the stream urls of the next conf.prefetchNum tracks are requested in the background
+    - the contributors/lyrics of all the tracks are fetched by the enrich stage
+    - the tracks are tagged by the tag stage, not by the download workers. With one download
+      thread the next transfer still runs while the previous track is tagged
+    - Return: number of failed tracks
+    '''
+    threadNum = conf.threadNum if conf.multiThreadDownload else 1
+    prefetcher = __StreamPrefetcher__(conf, tasks, conf.prefetchNum if len(tasks) > 1 else 0)
+    enricher = __EnrichStage__(conf, tasks)
+    tagger = __TagStage__(conf, TAG_THREAD_NUM, enricher)
+    try:
+        failed = 0
+        if len(tasks) <= 1:
+            # nothing to keep in order, the output is not buffered (progress bar)
+            for track, album, playlist in tasks:
+                failed += __collectResult__(__downloadTrack__(conf, track, album, playlist, prefetcher, tagger))
+            return failed
+
+        with ThreadPoolExecutor(max_workers=threadNum) as pool:
+            futures = [pool.submit(__runTask__, __downloadTrack__, conf, track, album, playlist, prefetcher, tagger)
+                       for track, album, playlist in tasks]
+            for future in futures:
+                check, lines = future.result()
+                Printf.flush(lines)
+                failed += __collectResult__(check)
+        return failed
+    finally:
+        prefetcher.close()
+        tagger.close()
+        enricher.close()
+
+
+def __downloadVideos__(conf, videos, album=None):
+    return sum(1 for item in videos if not __downloadVideo__(conf, item, album))
+
+
 def __album__(conf, obj):
     Printf.album(obj)
     msg, tracks, videos = API.getItems(obj.id, Type.Album)
     if not aigpy.string.isNull(msg):
         Printf.err(msg)
-        return
+        return 1
     if conf.saveAlbumInfo:
         __saveAlbumInfo__(conf, obj, tracks)
     if conf.saveCovers:
         __downloadCover__(conf, obj)
-    for item in tracks:
-        __downloadTrack__(conf, item, obj)
-    for item in videos:
-        __downloadVideo__(conf, item, obj)
+    failed = __downloadTracks__(conf, [(item, obj, None) for item in tracks])
+    return failed + __downloadVideos__(conf, videos, obj)
 
 
 def __track__(conf, obj):
@@ -431,12 +834,12 @@ def __track__(conf, obj):
     msg, album = API.getAlbum(obj.album.id)
     if conf.saveCovers:
         __downloadCover__(conf, album)
-    __downloadTrack__(conf, obj, album)
+    return 0 if __downloadTrack__(conf, obj, album) else 1
 
 
 def __video__(conf, obj):
     # Printf.video(obj)
-    __downloadVideo__(conf, obj, obj.album)
+    return 0 if __downloadVideo__(conf, obj, obj.album) else 1
 
 
 def __artist__(conf, obj):
@@ -444,9 +847,8 @@ def __artist__(conf, obj):
     Printf.artist(obj, len(albums))
     if not aigpy.string.isNull(msg):
         Printf.err(msg)
-        return
-    for item in albums:
-        __album__(conf, item)
+        return 1
+    return sum(__album__(conf, item) for item in albums)
 
 
 def __playlist__(conf, obj):
@@ -454,60 +856,183 @@ def __playlist__(conf, obj):
     msg, tracks, videos = API.getItems(obj.uuid, Type.Playlist)
     if not aigpy.string.isNull(msg):
         Printf.err(msg)
-        return
+        return 1
 
+    tasks = []
     for index, item in enumerate(tracks):
         mag, album = API.getAlbum(item.album.id)
         item.trackNumberOnPlaylist = index + 1
-        __downloadTrack__(conf, item, album, obj)
-    for item in videos:
-        __downloadVideo__(conf, item, None)
-
-
-def file(user, conf, string):
-    txt = aigpy.file.getContent(string)
-    if aigpy.string.isNull(txt):
-        Printf.err("Nothing can read!")
-        return
-    array = txt.split('\n')
-    for item in array:
+        tasks.append((item, album, obj))
+    failed = __downloadTracks__(conf, tasks)
+    return failed + __downloadVideos__(conf, videos)
+
+
+def __download__(user, conf, etype, obj):
+    '''Return: number of failed items'''
+    if etype == Type.Album:
+        return __album__(conf, obj)
+    if etype == Type.Track:
+        return __track__(conf, obj)
+    if etype == Type.Video:
+        __loadVideoAPI__(user)
+        return __video__(conf, obj)
+    if etype == Type.Artist:
+        return __artist__(conf, obj)
+    if etype == Type.Playlist:
+        return __playlist__(conf, obj)
+    return 0
+
+
+def __readLinks__(path):
+    txt = aigpy.file.getContent(path)
+    links = []
+    for item in txt.split('\n'):
+        item = item.strip()
         if aigpy.string.isNull(item):
             continue
         if item[0] == '#':
             continue
         if item[0] == '[':
             continue
-        start(user, conf, item)
+        links.append(item)
+    return links
 
 
-def start(user, conf, string):
+def __parseInputs__(string):
+    '''Split the input string, the link files are replaced by their links'''
+    inputs = []
+    for item in string.split(" "):
+        if aigpy.string.isNull(item):
+            continue
+        if os.path.isfile(item):
+            links = __readLinks__(item)
+            if len(links) <= 0:
+                Printf.err("Nothing can read! [" + item + "]")
+            inputs.extend(links)
+            continue
+        inputs.append(item)
+    return inputs
+
+
+def __prepare__(user, conf):
     __loadAPI__(user)
+    API.limiter.setRate(conf.requestRate, conf.requestBurst)
+    __loadCache__(conf)
+
+
+def file(user, conf, string):
+    links = __readLinks__(string)
+    if len(links) <= 0:
+        Printf.err("Nothing can read!")
+        return
+    start(user, conf, " ".join(links))
+
+
+def start(user, conf, string):
+    __prepare__(user, conf)
     if aigpy.string.isNull(string):
         Printf.err('Please enter something.')
         return
 
-    strings = string.split(" ")
-    for item in strings:
-        if aigpy.string.isNull(item):
-            continue
-        if os.path.exists(item):
-            file(user, conf, item)
-            return
-
+    for item in __parseInputs__(string):
         msg, etype, obj = API.getByString(item)
         if etype == Type.Null or not aigpy.string.isNull(msg):
             Printf.err(msg + " [" + item + "]")
-            return
+            continue
+        __download__(user, conf, etype, obj)
+
 
-        if etype == Type.Album:
-            __album__(conf, obj)
-        if etype == Type.Track:
-            __track__(conf, obj)
-        if etype == Type.Video:
-            __loadVideoAPI__(user)
-            __video__(conf, obj)
-        if etype == Type.Artist:
-            __artist__(conf, obj)
-        if etype == Type.Playlist:
-            __playlist__(conf, obj)
+def __getResultId__(etype, obj):
+    return str(obj.uuid) if etype == Type.Playlist else str(obj.id)
 
+
+def __getResultTitle__(etype, obj):
+    return obj.name if etype == Type.Artist else obj.title
+
+
+def __resolveInputs__(inputs):
+    '''Resolve the inputs concurrently, the ones with an id already seen are marked duplicate
+    - Return: (results, jobs), results: one status dict per input, jobs: [(result, etype, obj)] to download
+    '''
+    with ThreadPoolExecutor(max_workers=max(1, API.pageThreadNum)) as pool:
+        resolved = list(pool.map(API.getByString, inputs))
+
+    results = []
+    jobs = []
+    resolvedIds = {}
+    for item, (msg, etype, obj) in zip(inputs, resolved):
+        result = {'input': item, 'type': etype.name, 'id': None, 'title': None,
+                  'status': 'invalid', 'failed': 0, 'message': '', 'seconds': 0}
+        results.append(result)
+        if etype == Type.Null or not aigpy.string.isNull(msg):
+            result['message'] = msg
+            continue
+        result['id'] = __getResultId__(etype, obj)
+        result['title'] = __getResultTitle__(etype, obj)
+        key = (etype, result['id'])
+        if key in resolvedIds:
+            result['status'] = 'duplicate'
+            result['message'] = 'Same as ' + resolvedIds[key]
+            continue
+        resolvedIds[key] = item
+        result['status'] = 'queued'
+        jobs.append((result, etype, obj))
+    return results, jobs
+
+
+def __runBatchItem__(user, conf, result, etype, obj):
+    begin = time.time()
+    Printf.startCapture()
+    try:
+        failed = __download__(user, conf, etype, obj)
+        result['status'] = 'done' if failed == 0 else 'failed'
+        result['failed'] = failed
+    except Exception as e:
+        Printf.err(str(e))
+        result['status'] = 'failed'
+        result['message'] = str(e)
+    result['seconds'] = round(time.time() - begin, 2)
+    return Printf.stopCapture()
+
+
+def __saveResults__(path, results):
+    aigpy.path.mkdirs(aigpy.path.getDirName(os.path.abspath(path)))
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in results:
+            f.write(json.dumps(item, ensure_ascii=False) + '\n')
+
+
+def batch(user, conf, string, resultPath):
+    '''Download a large list of links (ids/urls/link files) by one shared work queue.
+    - all the links are resolved up front, the ones with the same resolved id are skipped
+    - conf.batchThreadNum items are downloaded at the same time
+    - one json line per link is written into resultPath at the end:
+      {input, type, id, title, status(done/failed/duplicate/invalid/queued), failed, message, seconds}
+    - Return: number of items that failed or are invalid
+    '''
+    __prepare__(user, conf)
+    inputs = __parseInputs__(string) if not aigpy.string.isNull(string) else []
+    if len(inputs) <= 0:
+        Printf.err('Please enter something.')
+        return 0
+
+    Printf.info('Resolving ' + str(len(inputs)) + ' links...')
+    results, jobs = __resolveInputs__(inputs)
+
+    Printf.info(str(len(jobs)) + ' items queued, ' + str(len(inputs) - len(jobs)) + ' skipped.')
+    pool = ThreadPoolExecutor(max_workers=conf.batchThreadNum)
+    futures = [pool.submit(__runBatchItem__, user, conf, result, etype, obj) for result, etype, obj in jobs]
+    try:
+        for future in futures:
+            Printf.flush(future.result())
+    finally:
+        # interrupted: the items not started yet stay 'queued' in the results
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
+        __saveResults__(resultPath, results)
+
+    done = sum(1 for item in results if item['status'] in ('done', 'duplicate'))
+    Printf.info('Batch finished: ' + str(done) + ' done, ' + str(len(results) - done) + ' failed. '
+                + 'Results: ' + resultPath)
+    return len(results) - done
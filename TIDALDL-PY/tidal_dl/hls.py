@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   hls.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   concurrent hls(m3u8) downloader
+'''
+import os
+import json
+import time
+import aigpy
+
+from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
+from aigpy.progressHelper import ProgressTool
+from tidal_dl.transfer import removePartState
+
+__TIMEOUT__ = (5.05, 30)
+
+
+def parsePlaylist(text, baseUrl):
+    '''Return: (segmentUrls, variantUrls) of a media or master playlist'''
+    segments = []
+    variants = []
+    isVariant = False
+    isSegment = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line == '':
+            continue
+        if line.startswith('#'):
+            if line.startswith('#EXT-X-STREAM-INF'):
+                isVariant = True
+            if line.startswith('#EXTINF'):
+                isSegment = True
+            continue
+        if isVariant:
+            variants.append(urljoin(baseUrl, line))
+        elif isSegment:
+            segments.append(urljoin(baseUrl, line))
+        isVariant = False
+        isSegment = False
+    return segments, variants
+
+
+def getSegmentUrls(session, url):
+    '''Return: (msg, urls), a master playlist is followed to its first variant'''
+    try:
+        for _ in range(2):
+            text = session.get(url, timeout=__TIMEOUT__).text
+            if '#EXTM3U' not in text:
+                return "Parse m3u8 url failed.", None
+            if 'METHOD=AES' in text or 'METHOD=SAMPLE-AES' in text:
+                return "Encrypted m3u8 is not supported.", None
+            segments, variants = parsePlaylist(text, url)
+            if len(segments) > 0:
+                return None, segments
+            if len(variants) <= 0:
+                break
+            url = variants[0]
+        return "Parse m3u8 url failed.", None
+    except Exception as e:
+        return str(e), None
+
+
+def __fetchSegment__(session, url, retry=3):
+    error = None
+    for index in range(retry):
+        try:
+            respond = session.get(url, timeout=__TIMEOUT__)
+            respond.raise_for_status()
+            return respond.content
+        except Exception as e:
+            error = e
+            time.sleep(0.5 * (2 ** index))
+    raise Exception("Segment download failed. " + str(error))
+
+
+def __loadState__(path, identity, count):
+    '''Get the number of segments already in path'''
+    try:
+        with open(path + '.json', 'r') as f:
+            state = json.load(f)
+        if state['identity'] != identity or state['length'] != count:
+            return 0
+        if aigpy.file.getSize(path) < state['bytes']:
+            return 0
+        return int(state['done'])
+    except:
+        return 0
+
+
+def __saveState__(path, identity, count, done, size):
+    state = {'identity': identity, 'length': count, 'done': done, 'bytes': size}
+    aigpy.file.write(path + '.json', json.dumps(state), 'w')
+
+
+def download(session, url, path, threadNum=8, showProgress=False, identity=None):
+    '''Download the hls stream into path, the segments are fetched by threadNum connections
+    and written in order.
+    - identity: stable id of the stream, when set an unfinished download resumes
+    - Return: (check, errmsg)
+    '''
+    msg, urls = getSegmentUrls(session, url)
+    if msg is not None:
+        return False, msg
+
+    part = path + '.part'
+    done = __loadState__(part, identity, len(urls)) if identity is not None else 0
+    size = 0
+    try:
+        aigpy.path.mkdirs(aigpy.path.getDirName(path))
+        if done > 0:
+            with open(part + '.json', 'r') as f:
+                size = json.load(f)['bytes']
+        progress = None
+        if showProgress:
+            progress = ProgressTool(len(urls), 15, unit='segments')
+            progress.setCurCount(done)
+
+        # a window of segments is in flight, the memory is bounded by its size
+        window = threadNum * 2
+        with open(part, 'r+b' if done > 0 else 'wb') as f, ThreadPoolExecutor(max_workers=threadNum) as pool:
+            f.seek(size)
+            f.truncate()
+            futures = {}
+            for index in range(done, min(done + window, len(urls))):
+                futures[index] = pool.submit(__fetchSegment__, session, urls[index])
+            for index in range(done, len(urls)):
+                if index + window < len(urls):
+                    futures[index + window] = pool.submit(__fetchSegment__, session, urls[index + window])
+                try:
+                    data = futures.pop(index).result()
+                except Exception as e:
+                    for item in futures.values():
+                        item.cancel()
+                    return False, str(e)
+                f.write(data)
+                size += len(data)
+                done = index + 1
+                if progress is not None:
+                    progress.setCurCount(done)
+                if identity is not None:
+                    f.flush()
+                    __saveState__(part, identity, len(urls), done, size)
+
+        os.replace(part, path)
+        removePartState(part)
+        return True, ""
+    except Exception as e:
+        return False, str(e)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   index.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   local index of the finished downloads
+'''
+import os
+import time
+import sqlite3
+import threading
+
+from tidal_dl.settings import getSettingsPath
+
+
+def getIndexPath():
+    return getSettingsPath() + '/.tidal-dl.index.db'
+
+
+class DownloadIndex(object):
+    '''Finished tracks keyed by track id + quality + format.
+    The format is the file name format resolved for the track (path without extension),
+    so the same track downloaded into another folder is a different entry.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else getIndexPath()
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.__lock, self.__conn:
+            self.__conn.execute("CREATE TABLE IF NOT EXISTS tracks ("
+                                "id TEXT, quality TEXT, format TEXT, path TEXT, size INTEGER, time REAL, "
+                                "PRIMARY KEY (id, quality, format))")
+
+    def find(self, id, quality, format):
+        '''Get the path of the finished file, None if it is unknown or changed on disk'''
+        with self.__lock:
+            row = self.__conn.execute("SELECT path, size FROM tracks WHERE id=? AND quality=? AND format=?",
+                                      (str(id), str(quality), format)).fetchone()
+        if row is None:
+            return None
+        path, size = row
+        if not os.path.isfile(path) or os.path.getsize(path) != size:
+            self.remove(id, quality, format)
+            return None
+        return path
+
+    def add(self, id, quality, format, path):
+        if not os.path.isfile(path):
+            return
+        with self.__lock, self.__conn:
+            self.__conn.execute("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?)",
+                                (str(id), str(quality), format, path, os.path.getsize(path), time.time()))
+
+    def remove(self, id, quality, format):
+        with self.__lock, self.__conn:
+            self.__conn.execute("DELETE FROM tracks WHERE id=? AND quality=? AND format=?",
+                                (str(id), str(quality), format))
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
@@ -35,6 +35,12 @@ class LangArabic(object):
     SETTING_ADD_LYRICS = "Add lyrics"
     SETTING_LYRICS_SERVER_PROXY = "Lyrics server proxy"
     SETTING_PATH = "Settings path"
+    SETTING_THREAD_NUM = "Download threads"
+    SETTING_BATCH_THREAD_NUM = "Batch threads"
+    SETTING_SEGMENT_NUM = "Segments per track"
+    SETTING_PREFETCH_NUM = "Prefetched stream urls"
+    SETTING_REQUEST_RATE = "Api requests per second"
+    SETTING_USE_CACHE = "Metadata cache"
     
     CHOICE = "خيار"
     FUNCTION = "وظيفة"
@@ -35,6 +35,12 @@ class LangChinese(object):
     SETTING_ADD_LYRICS = "添加歌词"
     SETTING_LYRICS_SERVER_PROXY = "歌词服务器代理"
     SETTING_PATH = "Settings path"
+    SETTING_THREAD_NUM = "下载线程数"
+    SETTING_BATCH_THREAD_NUM = "批量任务线程数"
+    SETTING_SEGMENT_NUM = "单曲分段数"
+    SETTING_PREFETCH_NUM = "预取的流地址数"
+    SETTING_REQUEST_RATE = "每秒接口请求数"
+    SETTING_USE_CACHE = "元数据缓存"
 
     CHOICE = "选项"
     FUNCTION = "功能"
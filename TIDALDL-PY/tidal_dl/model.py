@@ -4,90 +4,145 @@
 @File    :   model.py
 @Time    :   2020/08/08
 @Author  :   Yaronzz
-@Version :   2.0
+@Version :   3.0
 @Contact :   yaronhuang@foxmail.com
 @Desc    :   
 '''
-from aigpy.modelHelper import ModelBase
+
+__MISSING__ = object()
+# class -> ((name, lower name, nested model class), ...)
+__PLANS__ = {}
+
+
+class __ModelMeta__(type):
+    '''The __fields__ of a model class become its __slots__'''
+
+    def __new__(mcs, name, bases, attrs):
+        attrs['__slots__'] = tuple(attrs.get('__fields__', {}))
+        return super().__new__(mcs, name, bases, attrs)
+
+
+class ModelBase(metaclass=__ModelMeta__):
+    '''__fields__: {name: default}, the default of a nested field is its model class.
+    A new object gets the defaults, the nested fields are None (no shared objects).
+    '''
+    __fields__ = {}
+
+    def __init__(self):
+        for name, default in self.__fields__.items():
+            setattr(self, name, None if isinstance(default, type) else default)
+
+
+def __getPlan__(cls):
+    plan = __PLANS__.get(cls)
+    if plan is None:
+        plan = tuple((name, name.lower(), default if isinstance(default, type) else None)
+                     for name, default in cls.__fields__.items())
+        __PLANS__[cls] = plan
+    return plan
+
+
+def dictToModel(data, cls):
+    '''Get a cls object from a json dict, None if data is None.
+    Same rules as aigpy.modelHelper.dictToModel: the keys match case-insensitively, the
+    missing fields are None and the dicts (or lists of dicts) of nested fields become models.
+    '''
+    if data is None:
+        return None
+    obj = cls.__new__(cls)
+    lower = None
+    for name, key, model in __getPlan__(cls):
+        value = data.get(name, __MISSING__)
+        if value is __MISSING__:
+            if lower is None:
+                lower = {str(k).lower(): v for k, v in data.items()}
+            value = lower.get(key)
+        if model is not None and value is not None:
+            if isinstance(value, dict):
+                value = dictToModel(value, model)
+            elif isinstance(value, list) and len(value) > 0 and isinstance(value[0], dict):
+                value = [dictToModel(item, model) for item in value]
+        setattr(obj, name, value)
+    return obj
 
 
 class StreamUrl(ModelBase):
-    trackid = None
-    url = None
-    codec = None
-    encryptionKey = None
-    soundQuality = None
+    __fields__ = dict(trackid=None,
+                      url=None,
+                      codec=None,
+                      encryptionKey=None,
+                      soundQuality=None)
 
 class VideoStreamUrl(ModelBase):
-    codec = None
-    resolution = None
-    resolutions = None
-    m3u8Url = None
+    __fields__ = dict(codec=None,
+                      resolution=None,
+                      resolutions=None,
+                      m3u8Url=None)
 
 class Artist(ModelBase):
-    id = None
-    name = None
-    type = None
-    picture = None
+    __fields__ = dict(id=None,
+                      name=None,
+                      type=None,
+                      picture=None)
 
 class Album(ModelBase):
-    id = None
-    title = None
-    duration = 0
-    numberOfTracks = 0
-    numberOfVideos = 0
-    numberOfVolumes = 0
-    releaseDate = None
-    type = None
-    version = None
-    cover = None
-    explicit = False
-    audioQuality = None
-    audioModes = None
-    artist = Artist()
-    artists = Artist()
+    __fields__ = dict(id=None,
+                      title=None,
+                      duration=0,
+                      numberOfTracks=0,
+                      numberOfVideos=0,
+                      numberOfVolumes=0,
+                      releaseDate=None,
+                      type=None,
+                      version=None,
+                      cover=None,
+                      explicit=False,
+                      audioQuality=None,
+                      audioModes=None,
+                      artist=Artist,
+                      artists=Artist)
 
 class Track(ModelBase):
-    id = None
-    title = None
-    duration = 0
-    trackNumber = 0
-    volumeNumber = 0
-    trackNumberOnPlaylist = 0
-    version = None
-    isrc = None
-    explicit = False
-    audioQuality = None
-    copyRight = None
-    artist = Artist()
-    artists = Artist()
-    album = Album()
-    allowStreaming = False
+    __fields__ = dict(id=None,
+                      title=None,
+                      duration=0,
+                      trackNumber=0,
+                      volumeNumber=0,
+                      trackNumberOnPlaylist=0,
+                      version=None,
+                      isrc=None,
+                      explicit=False,
+                      audioQuality=None,
+                      copyRight=None,
+                      artist=Artist,
+                      artists=Artist,
+                      album=Album,
+                      allowStreaming=False)
 
 class Video(ModelBase):
-    id = None
-    title = None
-    duration = 0
-    imageID = None
-    trackNumber = 0
-    releaseDate = None
-    version = None
-    quality = None
-    explicit = False
-    artist = Artist()
-    artists =  Artist()
-    album = Album()
-    allowStreaming = False
+    __fields__ = dict(id=None,
+                      title=None,
+                      duration=0,
+                      imageID=None,
+                      trackNumber=0,
+                      releaseDate=None,
+                      version=None,
+                      quality=None,
+                      explicit=False,
+                      artist=Artist,
+                      artists=Artist,
+                      album=Album,
+                      allowStreaming=False)
 
 class Playlist(ModelBase):
-    uuid = None
-    title = None
-    numberOfTracks = 0
-    numberOfVideos = 0
-    description = None
-    duration = 0
-    image = None
-    squareImage = None
+    __fields__ = dict(uuid=None,
+                      title=None,
+                      numberOfTracks=0,
+                      numberOfVideos=0,
+                      description=None,
+                      duration=0,
+                      image=None,
+                      squareImage=None)
 
 
 
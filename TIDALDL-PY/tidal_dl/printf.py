@@ -10,7 +10,7 @@
 '''
 import aigpy
 import logging
-import prettytable
+import threading
 from tidal_dl.lang.language import getLangName, getLang
 from tidal_dl.settings import Settings, getSettingsPath
 from tidal_dl.model import Album, Track, Video, Playlist, Artist, StreamUrl, VideoStreamUrl
@@ -29,8 +29,46 @@ __LOGO__ = '''
 '''
 VERSION = '2021.7.6.2'
 
+# per-thread output buffer, used by the download workers to keep the console output in order
+__LOCAL__ = threading.local()
+
+
+def __print__(string):
+    buffer = getattr(__LOCAL__, 'buffer', None)
+    if buffer is None:
+        print(string)
+    else:
+        buffer.append(str(string))
+
+
+def __newTable__():
+    # prettytable is imported by the first table, not by the commands without one
+    import prettytable
+    return prettytable.PrettyTable()
+
+
 class Printf(object):
 
+    @staticmethod
+    def startCapture():
+        '''Buffer the output of the current thread until stopCapture'''
+        __LOCAL__.buffer = []
+
+    @staticmethod
+    def stopCapture():
+        buffer = getattr(__LOCAL__, 'buffer', None)
+        __LOCAL__.buffer = None
+        return buffer if buffer is not None else []
+
+    @staticmethod
+    def isCapturing():
+        return getattr(__LOCAL__, 'buffer', None) is not None
+
+    @staticmethod
+    def flush(lines):
+        for item in lines:
+            __print__(item)
+
     @staticmethod
     def logo():
         string = __LOGO__ + '\n                      v' + VERSION
@@ -40,7 +78,7 @@ class Printf(object):
     @staticmethod
     def usage():
         print("=============TIDAL-DL HELP==============")
-        tb = prettytable.PrettyTable()
+        tb = __newTable__()
         tb.field_names = [aigpy.cmd.green("OPTION"), aigpy.cmd.green("DESC")]
         tb.align = 'l'
         tb.add_row(["-h or --help", "show help-message"])
@@ -49,6 +87,13 @@ class Printf(object):
         tb.add_row(["-l or --link", "url/id/filePath"])
         tb.add_row(["-q or --quality", "track quality('Normal','High,'HiFi','Master')"])
         tb.add_row(["-r or --resolution", "video resolution('P1080', 'P720', 'P480', 'P360')"])
+        tb.add_row(["-j or --jobs", "number of tracks downloaded at the same time"])
+        tb.add_row(["-b or --batch", "download the links of -l in batch mode, write the results(json lines) to this file"])
+        tb.add_row(["--no-cache", "do not use the metadata cache"])
+        tb.add_row(["--refresh", "request the metadata again and update the cache"])
+        tb.add_row(["serve [--host] [--port] [--token]", "run as a daemon, jobs are submitted by http (POST /jobs)"])
+        tb.add_row(["sync --artist ID", "download the new or incomplete albums of the artist since the last sync"])
+        tb.add_row(["sync --playlist UUID [--prune]", "mirror the playlist: download the added tracks, --prune deletes the removed ones"])
         #tb.add_row(["-u or --username", "account-email"])
         #tb.add_row(["-p or --password", "account-password"])
         #tb.add_row(["-a or --accessToken", "account-accessToken"])
@@ -57,7 +102,7 @@ class Printf(object):
     @staticmethod
     def settings(data:Settings):
         LANG = getLang()
-        tb = prettytable.PrettyTable()
+        tb = __newTable__()
         tb.field_names = [aigpy.cmd.green(LANG.SETTING), aigpy.cmd.green(LANG.VALUE)]
         tb.align = 'l'
         # tb.add_row(["Settings path", getSettingsPath()])
@@ -80,6 +125,12 @@ class Printf(object):
         tb.add_row([LANG.SETTING_LANGUAGE, getLangName(data.language)])
         tb.add_row([LANG.SETTING_USE_PLAYLIST_FOLDER, data.usePlaylistFolder])
         tb.add_row([LANG.SETTING_MULITHREAD_DOWNLOAD, data.multiThreadDownload])
+        tb.add_row([LANG.SETTING_THREAD_NUM, data.threadNum])
+        tb.add_row([LANG.SETTING_BATCH_THREAD_NUM, data.batchThreadNum])
+        tb.add_row([LANG.SETTING_SEGMENT_NUM, data.segmentNum if data.segmentNum > 0 else "auto"])
+        tb.add_row([LANG.SETTING_PREFETCH_NUM, data.prefetchNum])
+        tb.add_row([LANG.SETTING_REQUEST_RATE, str(data.requestRate) + " (burst " + str(data.requestBurst) + ")"])
+        tb.add_row([LANG.SETTING_USE_CACHE, str(data.useCache) + " (" + str(data.cacheMaxSize) + " MB)"])
         tb.add_row([LANG.SETTING_ALBUM_FOLDER_FORMAT, data.albumFolderFormat])
         tb.add_row([LANG.SETTING_TRACK_FILE_FORMAT, data.trackFileFormat])
         tb.add_row([LANG.SETTING_ADD_LYRICS, data.addLyrics])
@@ -90,10 +141,10 @@ class Printf(object):
     def choices():
         LANG = getLang()
         print("====================================================")
-        tb = prettytable.PrettyTable()
+        tb = __newTable__()
         tb.field_names = [LANG.CHOICE, LANG.FUNCTION]
         tb.align = 'l'
-        tb.set_style(prettytable.PLAIN_COLUMNS)
+        tb.set_style(__import__('prettytable').PLAIN_COLUMNS)
         tb.add_row([aigpy.cmd.green(LANG.CHOICE_ENTER + " '0':"), LANG.CHOICE_EXIT])
         tb.add_row([aigpy.cmd.green(LANG.CHOICE_ENTER + " '1':"), LANG.CHOICE_LOGIN])
         tb.add_row([aigpy.cmd.green(LANG.CHOICE_ENTER + " '2':"), LANG.CHOICE_SETTINGS])
@@ -145,23 +196,23 @@ class Printf(object):
     @staticmethod
     def err(string):
         LANG = getLang()
-        print(aigpy.cmd.red(LANG.PRINT_ERR + " ") + string)
+        __print__(aigpy.cmd.red(LANG.PRINT_ERR + " ") + string)
         logging.error(string)
     
     @staticmethod
     def info(string):
         LANG = getLang()
-        print(aigpy.cmd.blue(LANG.PRINT_INFO + " ") + string)
+        __print__(aigpy.cmd.blue(LANG.PRINT_INFO + " ") + string)
 
     @staticmethod
     def success(string):
         LANG = getLang()
-        print(aigpy.cmd.green(LANG.PRINT_SUCCESS + " ") + string)
+        __print__(aigpy.cmd.green(LANG.PRINT_SUCCESS + " ") + string)
 
     @staticmethod
     def album(data: Album):
         LANG = getLang()
-        tb = prettytable.PrettyTable()
+        tb = __newTable__()
         tb.field_names = [aigpy.cmd.green(LANG.MODEL_ALBUM_PROPERTY), aigpy.cmd.green(LANG.VALUE)]
         tb.align = 'l'
         tb.add_row([LANG.MODEL_TITLE, data.title])
@@ -171,7 +222,7 @@ class Printf(object):
         tb.add_row([LANG.MODEL_RELEASE_DATE, data.releaseDate])
         tb.add_row([LANG.MODEL_VERSION, data.version])
         tb.add_row([LANG.MODEL_EXPLICIT, data.explicit])
-        print(tb)
+        __print__(tb)
         logging.info("====album " + str(data.id) + "====\n" +
                      "title:" + data.title + "\n" + 
                      "track num:" + str(data.numberOfTracks) + "\n" + 
@@ -182,7 +233,7 @@ class Printf(object):
     @staticmethod
     def track(data:Track, stream:StreamUrl = None):
         LANG = getLang()
-        tb = prettytable.PrettyTable()
+        tb = __newTable__()
         tb.field_names = [aigpy.cmd.green(LANG.MODEL_TRACK_PROPERTY), aigpy.cmd.green(LANG.VALUE)]
         tb.align = 'l'
         tb.add_row([LANG.MODEL_TITLE, data.title])
@@ -194,7 +245,7 @@ class Printf(object):
         if stream is not None:
             tb.add_row(["Get-Q", str(stream.soundQuality)])
             tb.add_row(["Get-Codec", str(stream.codec)])
-        print(tb)
+        __print__(tb)
         logging.info("====track " + str(data.id) + "====\n" + \
                      "title:" + data.title + "\n" + \
                      "version:" + str(data.version) + "\n" + \
@@ -203,7 +254,7 @@ class Printf(object):
     @staticmethod
     def video(data:Video, stream:VideoStreamUrl = None):
         LANG = getLang()
-        tb = prettytable.PrettyTable()
+        tb = __newTable__()
         tb.field_names = [aigpy.cmd.green(LANG.MODEL_VIDEO_PROPERTY), aigpy.cmd.green(LANG.VALUE)]
         tb.align = 'l'
         tb.add_row([LANG.MODEL_TITLE, data.title])
@@ -215,7 +266,7 @@ class Printf(object):
             tb.add_row(["Get-Q", str(stream.resolution)])
             tb.add_row(["Get-Codec", str(stream.codec)])
 
-        print(tb)
+        __print__(tb)
         logging.info("====video " + str(data.id) + "====\n" +
                      "title:" + data.title + "\n" +
                      "version:" + str(data.version) + "\n" +
@@ -224,14 +275,14 @@ class Printf(object):
     @staticmethod
     def artist(data:Artist, num):
         LANG = getLang()
-        tb = prettytable.PrettyTable()
+        tb = __newTable__()
         tb.field_names = [aigpy.cmd.green(LANG.MODEL_ARTIST_PROPERTY), aigpy.cmd.green(LANG.VALUE)]
         tb.align = 'l'
         tb.add_row([LANG.MODEL_ID, data.id])
         tb.add_row([LANG.MODEL_NAME, data.name])
         tb.add_row(["Number of albums", num])
         tb.add_row([LANG.MODEL_TYPE, str(data.type)])
-        print(tb)
+        __print__(tb)
         logging.info("====artist " + str(data.id) + "====\n" +
                      "name:" + data.name + "\n" +
                      "album num:" + str(num) + "\n" +
@@ -240,13 +291,13 @@ class Printf(object):
     @staticmethod
     def playlist(data):
         LANG = getLang()
-        tb = prettytable.PrettyTable()
+        tb = __newTable__()
         tb.field_names = [aigpy.cmd.green(LANG.MODEL_PLAYLIST_PROPERTY), aigpy.cmd.green(LANG.VALUE)]
         tb.align = 'l'
         tb.add_row([LANG.MODEL_TITLE, data.title])
         tb.add_row([LANG.MODEL_TRACK_NUMBER, data.numberOfTracks])
         tb.add_row([LANG.MODEL_VIDEO_NUMBER, data.numberOfVideos])
-        print(tb)
+        __print__(tb)
         logging.info("====playlist " + str(data.uuid) + "====\n" +
                      "title:" + data.title + "\n" +
                      "track num:" + str(data.numberOfTracks) + "\n" +
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   ratelimit.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   token bucket rate limiter with adaptive backoff
+'''
+import time
+import random
+import threading
+
+from email.utils import parsedate_to_datetime
+
+
+def parseRetryAfter(value):
+    '''Get the seconds of a Retry-After header (seconds or http-date), None if invalid'''
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class RateLimiter(object):
+    '''Token bucket shared by all the api requests.
+    - rate: requests per second, burst: max number of tokens in the bucket
+    - the rate is halved on each 429 and grows back step by step on success
+    '''
+
+    def __init__(self, rate=10, burst=20, minRate=0.5, backoffBase=0.5, backoffCap=30):
+        self.backoffBase = backoffBase
+        self.backoffCap = backoffCap
+        self.minRate = minRate
+        self.__lock = threading.Lock()
+        self.__pauseUntil = 0
+        self.setRate(rate, burst)
+
+    def setRate(self, rate, burst=None):
+        burst = max(1, int(burst if burst is not None else rate))
+        if getattr(self, 'maxRate', None) == max(self.minRate, float(rate)) and self.burst == burst:
+            return
+        with self.__lock:
+            self.maxRate = max(self.minRate, float(rate))
+            self.rate = self.maxRate
+            self.burst = burst
+            self.__tokens = float(self.burst)
+            self.__last = time.monotonic()
+
+    def acquire(self):
+        '''Block until a request is allowed'''
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.rate)
+                self.__last = now
+                if now < self.__pauseUntil:
+                    wait = self.__pauseUntil - now
+                elif self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.__tokens) / self.rate
+            time.sleep(wait)
+
+    def success(self):
+        with self.__lock:
+            if self.rate < self.maxRate:
+                self.rate = min(self.maxRate, self.rate + self.maxRate / 100)
+
+    def throttle(self, status, retryAfter=None, attempt=1):
+        '''Record a 429/5xx respond, return the seconds to wait before the next try'''
+        wait = parseRetryAfter(retryAfter)
+        if wait is None:
+            # full jitter exponential backoff
+            wait = random.uniform(0, min(self.backoffCap, self.backoffBase * (2 ** attempt)))
+        with self.__lock:
+            if status == 429:
+                self.rate = max(self.minRate, self.rate / 2)
+                # every thread waits, not only the throttled one
+                self.__pauseUntil = max(self.__pauseUntil, time.monotonic() + wait)
+        return wait
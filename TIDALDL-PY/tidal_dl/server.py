@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   server.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   daemon mode, local http api for download jobs
+'''
+import os
+import re
+import hmac
+import json
+import time
+import socket
+import logging
+import ipaddress
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tidal_dl.printf import Printf, VERSION
+from tidal_dl.download import __prepare__, __resolveInputs__, __runBatchItem__
+
+__JOB_PATH__ = re.compile(r'^/jobs/(\d+)$')
+# finished jobs kept for the queries
+__MAX_FINISHED_JOBS__ = 1000
+# the access token is refreshed when it expires within this seconds
+__TOKEN_MARGIN__ = 600
+
+
+def parseJobLink(link):
+    '''Split the link string of a job into ids/urls. Unlike the -l option the link files are not read,
+    a job must not make the daemon read a file of the host.
+    - Return: (msg, inputs)
+    '''
+    inputs = link.split()
+    for item in inputs:
+        if os.path.exists(item):
+            return "File paths are not allowed in jobs [" + item + "]", None
+    return None, inputs
+
+
+def isLoopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (socket.error, ValueError):
+        return False
+
+
+class Job(object):
+    def __init__(self, id, link):
+        self.id = id
+        self.link = link
+        self.status = 'queued'
+        self.cancelled = False
+        self.items = []
+        self.output = []
+        self.created = time.time()
+        self.started = 0
+        self.finished = 0
+        self.future = None
+
+    def isFinished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def toDict(self, detail=False):
+        data = {'id': self.id, 'link': self.link, 'status': self.status,
+                'created': self.created, 'started': self.started, 'finished': self.finished,
+                'items': len(self.items),
+                'failed': sum(1 for item in self.items if item['status'] in ('failed', 'invalid'))}
+        if detail:
+            data['items'] = list(self.items)
+            data['output'] = list(self.output)
+        return data
+
+
+class JobQueue(object):
+    '''Download jobs run on a shared pool, the api session, caches and index stay warm between jobs.
+    A job is a link string of ids/urls separated by spaces, link files are not allowed.
+    - cancel: a queued job never starts, a running job stops after its current item
+    - refreshLogin: refreshes the token without any prompt, Return: (msg, check). It is called
+      before each item when the token expires soon, a failed refresh fails the job
+    '''
+
+    def __init__(self, user, conf, refreshLogin=None):
+        self.user = user
+        self.conf = conf
+        self.refreshLogin = refreshLogin
+        self.__jobs = {}
+        self.__nextId = 1
+        self.__lock = threading.Lock()
+        self.__loginLock = threading.Lock()
+        self.__pool = ThreadPoolExecutor(max_workers=conf.batchThreadNum)
+        __prepare__(user, conf)
+
+    def submit(self, link):
+        with self.__lock:
+            job = Job(self.__nextId, link)
+            self.__nextId += 1
+            self.__jobs[job.id] = job
+            self.__removeFinished__()
+        job.future = self.__pool.submit(self.__run__, job)
+        return job
+
+    def get(self, id):
+        with self.__lock:
+            return self.__jobs.get(id)
+
+    def list(self):
+        with self.__lock:
+            return list(self.__jobs.values())
+
+    def cancel(self, id):
+        job = self.get(id)
+        if job is None:
+            return None
+        job.cancelled = True
+        if job.future is not None and job.future.cancel():
+            job.status = 'cancelled'
+            job.finished = time.time()
+        return job
+
+    def close(self):
+        for job in self.list():
+            self.cancel(job.id)
+        self.__pool.shutdown(wait=True)
+
+    def __removeFinished__(self):
+        finished = [job for job in self.__jobs.values() if job.isFinished()]
+        for job in finished[:max(0, len(finished) - __MAX_FINISHED_JOBS__)]:
+            self.__jobs.pop(job.id)
+
+    def __refreshLogin__(self):
+        if self.refreshLogin is None:
+            return
+        with self.__loginLock:
+            # an unknown expiry (token entered by hand) is refreshed too, the refresh tells it
+            if (self.user.expiresAfter or 0) - time.time() > __TOKEN_MARGIN__:
+                return
+            msg, check = self.refreshLogin()
+            if not check:
+                raise Exception("Login expired. " + str(msg))
+            __prepare__(self.user, self.conf)
+
+    def __run__(self, job):
+        if job.cancelled:
+            return
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            self.__refreshLogin__()
+            msg, inputs = parseJobLink(job.link)
+            if msg is not None:
+                raise Exception(msg)
+            job.items, items = __resolveInputs__(inputs)
+            for result, etype, obj in items:
+                if job.cancelled:
+                    result['status'] = 'cancelled'
+                    continue
+                self.__refreshLogin__()
+                job.output.extend(__runBatchItem__(self.user, self.conf, result, etype, obj))
+            if job.cancelled:
+                job.status = 'cancelled'
+            elif any(item['status'] in ('failed', 'invalid') for item in job.items):
+                job.status = 'failed'
+            else:
+                job.status = 'done'
+        except Exception as e:
+            logging.exception(e)
+            job.output.append(str(e))
+            job.status = 'failed'
+        job.finished = time.time()
+        Printf.info('Job ' + str(job.id) + ' ' + job.status + ': ' + job.link)
+
+
+class __Handler__(BaseHTTPRequestHandler):
+    queue = None
+    token = None
+
+    def log_message(self, format, *args):
+        logging.info("[serve] " + format % args)
+
+    def __respond__(self, code, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def __isAllowed__(self):
+        '''Browsers send an Origin, a web page must not reach the api (a plain text POST needs no preflight).
+        With a token every request needs the header "Authorization: Bearer <token>".
+        '''
+        if self.headers.get('Origin') is not None:
+            self.__respond__(403, {'error': 'Cross-origin requests are not allowed.'})
+            return False
+        if self.token is not None:
+            value = self.headers.get('Authorization', '')
+            if not hmac.compare_digest(value.encode('utf-8'), ('Bearer ' + self.token).encode('utf-8')):
+                self.__respond__(401, {'error': 'Invalid token.'})
+                return False
+        return True
+
+    def __getJobId__(self):
+        match = __JOB_PATH__.match(self.path.split('?')[0])
+        return int(match.group(1)) if match else None
+
+    def __readLink__(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8') if length > 0 else ''
+        try:
+            data = json.loads(body)
+            if isinstance(data, dict):
+                return str(data.get('link', ''))
+        except ValueError:
+            pass
+        # plain text body: the links themselves
+        return ' '.join(body.split())
+
+    def do_GET(self):
+        if not self.__isAllowed__():
+            return
+        path = self.path.split('?')[0]
+        if path == '/status':
+            jobs = self.queue.list()
+            self.__respond__(200, {'version': VERSION,
+                                   'queued': sum(1 for job in jobs if job.status == 'queued'),
+                                   'running': sum(1 for job in jobs if job.status == 'running')})
+            return
+        if path == '/jobs':
+            self.__respond__(200, [job.toDict() for job in self.queue.list()])
+            return
+        id = self.__getJobId__()
+        job = self.queue.get(id) if id is not None else None
+        if job is None:
+            self.__respond__(404, {'error': 'Job not found.'})
+            return
+        self.__respond__(200, job.toDict(detail=True))
+
+    def do_POST(self):
+        if not self.__isAllowed__():
+            return
+        if self.path.split('?')[0] != '/jobs':
+            self.__respond__(404, {'error': 'Not found.'})
+            return
+        link = self.__readLink__().strip()
+        if link == '':
+            self.__respond__(400, {'error': 'Please enter something.'})
+            return
+        msg, inputs = parseJobLink(link)
+        if msg is not None:
+            self.__respond__(400, {'error': msg})
+            return
+        self.__respond__(201, self.queue.submit(link).toDict())
+
+    def do_DELETE(self):
+        if not self.__isAllowed__():
+            return
+        id =  self.__getJobId__()
+        job = self.queue.cancel(id) if id is not None else None
+        if job is None:
+            self.__respond__(404, {'error': 'Job not found.'})
+            return
+        self.__respond__(200, job.toDict())
+
+
+def serve(user, conf, host='127.0.0.1', port=8765, refreshLogin=None, token=None):
+    '''Run the job api until ctrl+c
+    - POST /jobs {"link": "..."}: submit, GET /jobs: list, GET /jobs/<id>: status with items and output
+    - DELETE /jobs/<id>: cancel, GET /status: queue size
+    - token: required by every request when set, a host other than loopback needs one
+    '''
+    if token is None and not isLoopback(host):
+        Printf.err("Serving on " + host + " needs a token (--token).")
+        return
+    queue = JobQueue(user, conf, refreshLogin)
+    handler = type('Handler', (__Handler__,), {'queue': queue, 'token': token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    Printf.info('Serving on http://' + host + ':' + str(port) + ' (ctrl+c to stop)')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.close()
@@ -40,6 +40,18 @@ def getSettingsPath():
 def getLogPath():
     return getSettingsPath() + '/.tidal-dl.log'
 
+def getCachePath():
+    return getSettingsPath() + '/.tidal-dl.cache.db'
+
+def getLyricsCachePath():
+    return getSettingsPath() + '/.tidal-dl.lyrics.db'
+
+def getImageCachePath():
+    return getSettingsPath() + '/.tidal-dl.images'
+
+def getVersionPath():
+    return getSettingsPath() + '/.tidal-dl.version.json'
+
 
 class TokenSettings(ModelBase):
     userid = None
@@ -93,6 +105,14 @@ class Settings(ModelBase):
     language = 0
     usePlaylistFolder = True
     multiThreadDownload = True
+    threadNum = 3
+    batchThreadNum = 2
+    segmentNum = 1
+    prefetchNum = 3
+    requestRate = 10
+    requestBurst = 20
+    useCache = True
+    cacheMaxSize = 200
     albumFolderFormat = R"{ArtistName}/{Flag} {AlbumTitle} [{AlbumID}] [{AlbumYear}]"
     trackFileFormat = R"{TrackNumber} - {ArtistName} - {TrackTitle}{ExplicitFlag}"
     showProgress = True
@@ -120,6 +140,14 @@ class Settings(ModelBase):
         ret.videoQuality = Settings.getVideoQuality(ret.videoQuality)
         ret.usePlaylistFolder = ret.usePlaylistFolder == True or ret.usePlaylistFolder is None
         ret.multiThreadDownload = ret.multiThreadDownload == True or ret.multiThreadDownload is None
+        ret.threadNum = Settings.getThreadNum(ret.threadNum)
+        ret.batchThreadNum = Settings.getThreadNum(ret.batchThreadNum) if ret.batchThreadNum is not None else 2
+        ret.segmentNum = ret.segmentNum if isinstance(ret.segmentNum, int) and ret.segmentNum >= 0 else 1
+        ret.prefetchNum = ret.prefetchNum if isinstance(ret.prefetchNum, int) and ret.prefetchNum >= 0 else 3
+        ret.requestRate = ret.requestRate if isinstance(ret.requestRate, (int, float)) and ret.requestRate > 0 else 10
+        ret.requestBurst = ret.requestBurst if isinstance(ret.requestBurst, int) and ret.requestBurst > 0 else 20
+        ret.useCache = ret.useCache == True or ret.useCache is None
+        ret.cacheMaxSize = ret.cacheMaxSize if isinstance(ret.cacheMaxSize, int) and ret.cacheMaxSize > 0 else 200
         if ret.albumFolderFormat is None:
             ret.albumFolderFormat = Settings.getDefaultAlbumFolderFormat()
         if ret.trackFileFormat is None:
@@ -142,6 +170,13 @@ class Settings(ModelBase):
                 return item
         return AudioQuality.Normal
 
+    @staticmethod
+    def getThreadNum(value):
+        try:
+            return max(1, int(value))
+        except:
+            return 3
+
     @staticmethod
     def getVideoQuality(value):
         for item in VideoQuality:
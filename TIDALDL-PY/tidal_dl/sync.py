@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   sync.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   incremental sync of artists and playlists
+'''
+import os
+import time
+import sqlite3
+import threading
+import aigpy
+
+from tidal_dl.enum import Type
+from tidal_dl.printf import Printf
+from tidal_dl.settings import getSettingsPath
+from tidal_dl.download import API, __prepare__, __getIndex__, __getTrackPath__, __downloadTracks__, \
+    __downloadCover__, __saveAlbumInfo__, __getPlaylistPath__
+
+
+def getSyncPath():
+    return getSettingsPath() + '/.tidal-dl.sync.db'
+
+
+class SyncManifest(object):
+    '''What the last syncs left on disk, per audio quality.
+    - albums: the albums of an artist, complete when all their tracks are done (or not streamable)
+    - tracks: the state of the tracks of an album, done/failed/unavailable
+    - playlists: the tracks of a mirrored playlist that are on disk, with their path
+    '''
+
+    def __init__(self, path=None):
+        self.path = path if path is not None else getSyncPath()
+        self.__lock = threading.Lock()
+        self.__conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self.__lock, self.__conn:
+            self.__conn.execute("CREATE TABLE IF NOT EXISTS albums ("
+                                "artist TEXT, album TEXT, quality TEXT, title TEXT, complete INTEGER, time REAL, "
+                                "PRIMARY KEY (artist, album, quality))")
+            self.__conn.execute("CREATE TABLE IF NOT EXISTS tracks ("
+                                "album TEXT, track TEXT, quality TEXT, state TEXT, time REAL, "
+                                "PRIMARY KEY (album, track, quality))")
+            self.__conn.execute("CREATE TABLE IF NOT EXISTS playlists ("
+                                "playlist TEXT, track TEXT, quality TEXT, path TEXT, time REAL, "
+                                "PRIMARY KEY (playlist, track, quality))")
+
+    def getCompleteAlbums(self, artist, quality):
+        with self.__lock:
+            rows = self.__conn.execute("SELECT album FROM albums WHERE artist=? AND quality=? AND complete=1",
+                                       (str(artist), quality)).fetchall()
+        return set(row[0] for row in rows)
+
+    def setAlbum(self, artist, album, quality, title, complete):
+        with self.__lock, self.__conn:
+            self.__conn.execute("INSERT OR REPLACE INTO albums VALUES (?, ?, ?, ?, ?, ?)",
+                                (str(artist), str(album), quality, title, 1 if complete else 0, time.time()))
+
+    def getTrackStates(self, album, quality):
+        '''Return: {trackId: state}'''
+        with self.__lock:
+            rows = self.__conn.execute("SELECT track, state FROM tracks WHERE album=? AND quality=?",
+                                       (str(album), quality)).fetchall()
+        return dict(rows)
+
+    def setTrackStates(self, album, quality, states):
+        now = time.time()
+        with self.__lock, self.__conn:
+            self.__conn.executemany("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?)",
+                                    [(str(album), str(track), quality, state, now) for track, state in states.items()])
+
+    def getPlaylistPaths(self, playlist, quality):
+        '''Return: {trackId: path}'''
+        with self.__lock:
+            rows = self.__conn.execute("SELECT track, path FROM playlists WHERE playlist=? AND quality=?",
+                                       (str(playlist), quality)).fetchall()
+        return dict(rows)
+
+    def setPlaylistPaths(self, playlist, quality, paths):
+        '''Replace the tracks of the playlist by paths: {trackId: path}'''
+        now = time.time()
+        with self.__lock, self.__conn:
+            self.__conn.execute("DELETE FROM playlists WHERE playlist=? AND quality=?", (str(playlist), quality))
+            self.__conn.executemany("INSERT INTO playlists VALUES (?, ?, ?, ?, ?)",
+                                    [(str(playlist), str(track), quality, path, now) for track, path in paths.items()])
+
+    def isPathUsed(self, path, exceptPlaylist):
+        with self.__lock:
+            row = self.__conn.execute("SELECT 1 FROM playlists WHERE path=? AND playlist!=? LIMIT 1",
+                                      (path, str(exceptPlaylist))).fetchone()
+        return row is not None
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
+
+
+def __getTrackState__(conf, track, album, playlist=None):
+    if track.allowStreaming is False:
+        return 'unavailable'
+    trackFormat = __getTrackPath__(conf, track, None, album, playlist)
+    if __getIndex__().find(track.id, conf.audioQuality.name, trackFormat) is not None:
+        return 'done'
+    return 'failed'
+
+
+def __syncAlbum__(conf, manifest, artistId, album):
+    '''Download the tracks of the album that are not done yet, Return: number of failed tracks'''
+    Printf.album(album)
+    msg, tracks, videos = API.getItems(album.id, Type.Album)
+    if msg is not None:
+        Printf.err(msg)
+        return 1
+    quality = conf.audioQuality.name
+    states = manifest.getTrackStates(album.id, quality)
+    if conf.saveAlbumInfo:
+        __saveAlbumInfo__(conf, album, tracks)
+    if conf.saveCovers:
+        __downloadCover__(conf, album)
+    missing = [item for item in tracks if states.get(str(item.id)) != 'done']
+    failed = __downloadTracks__(conf, [(item, album, None) for item in missing])
+
+    # the download index tells which tracks are on disk now
+    for item in missing:
+        states[str(item.id)] = __getTrackState__(conf, item, album)
+    manifest.setTrackStates(album.id, quality, dict((str(item.id), states[str(item.id)]) for item in missing))
+    complete = all(state in ('done', 'unavailable') for state in states.values())
+    manifest.setAlbum(artistId, album.id, quality, album.title, complete)
+    return failed
+
+
+def syncArtist(user, conf, id, manifest=None):
+    '''Download the albums of the artist that are new or incomplete since the last sync.
+    A complete album costs no request, so a sync without changes only lists the albums.
+    Only the tracks of the albums are synced, not their videos.
+    - Return: number of failed tracks
+    '''
+    __prepare__(user, conf)
+    manifest = manifest if manifest is not None else SyncManifest()
+    msg, albums = API.getArtistAlbums(id, conf.includeEP, refresh=True)
+    if msg is not None:
+        Printf.err(msg + " [" + str(id) + "]")
+        return 1
+
+    complete = manifest.getCompleteAlbums(id, conf.audioQuality.name)
+    pending = []
+    for album in albums:
+        if str(album.id) not in complete and all(album.id != item.id for item in pending):
+            pending.append(album)
+    name = albums[0].artist.name if len(albums) > 0 and albums[0].artist is not None else str(id)
+    Printf.info(name + ': ' + str(len(albums)) + ' albums, ' + str(len(pending)) + ' new or incomplete.')
+    return sum(__syncAlbum__(conf, manifest, id, album) for album in pending)
+
+
+def __writeM3u__(playlist, tracks, paths, m3uPath):
+    '''Write the playlist in order, the file is left untouched if nothing changed'''
+    base = aigpy.path.getDirName(m3uPath)
+    lines = ['#EXTM3U']
+    for item in tracks:
+        path = paths.get(str(item.id))
+        if path is None:
+            continue
+        artist = item.artists[0].name if item.artists else ''
+        lines.append('#EXTINF:' + str(item.duration) + ',' + artist + ' - ' + item.title)
+        lines.append(os.path.relpath(path, base).replace('\\', '/'))
+    content = '\n'.join(lines) + '\n'
+    try:
+        with open(m3uPath, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return
+    except (IOError, UnicodeDecodeError):
+        pass
+    aigpy.path.mkdirs(base)
+    with open(m3uPath, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def __pruneTracks__(manifest, playlist, base, paths):
+    '''Delete the files of the removed tracks. Only the files in the playlist folder that no other
+    mirrored playlist uses are deleted, a track saved in its album folder may belong to an album too.
+    '''
+    base = os.path.abspath(base)
+    for path in paths:
+        if not os.path.abspath(path).startswith(base + os.sep):
+            continue
+        if manifest.isPathUsed(path, playlist.uuid):
+            continue
+        aigpy.path.remove(path)
+        Printf.info('Removed ' + aigpy.path.getFileName(path))
+
+
+def syncPlaylist(user, conf, uuid, prune=False, manifest=None):
+    '''Mirror the playlist: download the tracks added since the last sync, optionally delete the
+    removed ones and rewrite the m3u in the current order. The tracks already on disk keep their
+    files and cost no request, so the cost grows with the change and not with the playlist.
+    Only the tracks of the playlist are mirrored, not its videos.
+    - Return: number of failed tracks
+    '''
+    __prepare__(user, conf)
+    manifest = manifest if manifest is not None else SyncManifest()
+    msg, playlist = API.getPlaylist(uuid)
+    if msg is not None:
+        Printf.err(msg + " [" + str(uuid) + "]")
+        return 1
+    msg, tracks, videos = API.getItems(playlist.uuid, Type.Playlist, refresh=True)
+    if msg is not None:
+        Printf.err(msg)
+        return 1
+
+    quality = conf.audioQuality.name
+    known = manifest.getPlaylistPaths(playlist.uuid, quality)
+    current = set(str(item.id) for item in tracks)
+    paths = {}
+    added = []
+    for index, item in enumerate(tracks):
+        path = known.get(str(item.id))
+        if path is not None and os.path.isfile(path):
+            paths[str(item.id)] = path
+        elif item.allowStreaming is not False and str(item.id) not in paths:
+            item.trackNumberOnPlaylist = index + 1
+            added.append(item)
+    removed = dict((track, path) for track, path in known.items() if track not in current)
+    Printf.playlist(playlist)
+    Printf.info(playlist.title + ': ' + str(len(added)) + ' added, ' + str(len(removed)) + ' removed.')
+
+    tasks = []
+    for item in added:
+        msg, album = API.getAlbum(item.album.id)
+        if msg is not None:
+            Printf.err(msg + " [" + item.title + "]")
+            continue
+        tasks.append((item, album, playlist))
+    failed = __downloadTracks__(conf, tasks) + len(added) - len(tasks)
+
+    # the download index tells where the new tracks are
+    for item, album, _ in tasks:
+        trackFormat = __getTrackPath__(conf, item, None, album, playlist)
+        path = __getIndex__().find(item.id, quality, trackFormat)
+        if path is not None:
+            paths[str(item.id)] = path
+
+    base = __getPlaylistPath__(conf, playlist)
+    if prune and len(removed) > 0:
+        used = set(paths.values())
+        __pruneTracks__(manifest, playlist, base, [path for path in removed.values() if path not in used])
+    # without prune the removed tracks stay in the manifest (not in the m3u), a later prune deletes them
+    manifest.setPlaylistPaths(playlist.uuid, quality, paths if prune else dict(removed, **paths))
+    __writeM3u__(playlist, tracks, paths, base + aigpy.path.replaceLimitChar(playlist.title, '-') + '.m3u')
+    return failed
@@ -14,15 +14,22 @@ import uuid
 import requests
 import json
 import base64
+import time
 import logging
+import threading
 import aigpy.stringHelper as stringHelper
 import aigpy.systemHelper as systemHelper
 import aigpy.fileHelper as fileHelper
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 from requests.packages import urllib3
-from aigpy.modelHelper import dictToModel
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
 from aigpy.stringHelper import isNull
-from tidal_dl.model import Album, Track, Video, Artist, Playlist, StreamUrl, VideoStreamUrl
+from tidal_dl.model import Album, Track, Video, Artist, Playlist, StreamUrl, VideoStreamUrl, ModelBase, dictToModel
 from tidal_dl.enum import Type, AudioQuality, VideoQuality
+from tidal_dl.cache import LRUCache
+from tidal_dl.ratelimit import RateLimiter
 
 __VERSION__ = '1.9.1'
 __URL_PRE__ = 'https://api.tidalhifi.com/v1/'
@@ -34,6 +41,66 @@ __API_KEY__ = {'clientId': 'aR7gUaTK1ihpXOEP', 'clientSecret': 'eVWBEkuL2FCjxgjO
 urllib3.disable_warnings()
 # add retry number
 requests.adapters.DEFAULT_RETRIES = 5
+# (connect, read) timeout of every request
+__TIMEOUT__ = (5.05, 30)
+
+# max number of tries of a 429/5xx api respond
+__MAX_THROTTLE_RETRY__ = 6
+
+# seconds to keep the responds of the catalog endpoints in the disk cache
+__CACHE_TTL__ = [
+    (re.compile(r'^albums/[^/]+$'), 7 * 86400),
+    (re.compile(r'^albums/[^/]+/items$'), 7 * 86400),
+    (re.compile(r'^artists/[^/]+$'), 7 * 86400),
+    (re.compile(r'^artists/[^/]+/albums$'), 12 * 3600),
+    (re.compile(r'^tracks/[^/]+$'), 7 * 86400),
+    (re.compile(r'^tracks/[^/]+/contributors$'), 30 * 86400),
+    (re.compile(r'^videos/[^/]+$'), 7 * 86400),
+    (re.compile(r'^playlists/[^/]+$'), 600),
+    (re.compile(r'^playlists/[^/]+/items$'), 600),
+]
+
+__UUID_PATTERN__ = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+
+__SESSIONS__ = {}
+__SESSIONS_LOCK__ = threading.Lock()
+# every api request of the process goes through this limiter
+__RATE_LIMITER__ = RateLimiter()
+
+
+def __newSession__(poolSize, retry, statusRetry):
+    session = requests.Session()
+    # connection errors are retried by the caller, the adapter only retries the 5xx respond
+    statusList = [500, 502, 503, 504] if statusRetry else []
+    retries = Retry(total=retry, connect=0, read=0, status=retry, backoff_factor=0.5,
+                    status_forcelist=statusList, respect_retry_after_header=statusRetry,
+                    raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize, max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def getSession(name='api', poolSize=10, retry=3, statusRetry=True):
+    '''Get the shared keep-alive session of a host group.
+    - name: 'api' for the metadata/auth hosts, 'cdn' for the media and image hosts
+    - poolSize/retry/statusRetry: only used by the first call which creates the session
+    '''
+    with __SESSIONS_LOCK__:
+        if name not in __SESSIONS__:
+            __SESSIONS__[name] = __newSession__(poolSize, retry, statusRetry)
+        return __SESSIONS__[name]
+
+
+def getRateLimiter():
+    return __RATE_LIMITER__
+
+
+def __getCacheTTL__(path):
+    for pattern, ttl in __CACHE_TTL__:
+        if pattern.match(path):
+            return ttl
+    return 0
 
 
 class LoginKey(object):
@@ -50,23 +117,39 @@ class LoginKey(object):
         self.expiresIn = None
 
 
-class __StreamRespond__(object):
-    trackid = None
-    videoid = None
-    streamType = None
-    assetPresentation = None
-    audioMode = None
-    audioQuality = None
-    videoQuality = None
-    manifestMimeType = None
-    manifest = None
+class __StreamRespond__(ModelBase):
+    __fields__ = dict(trackid=None,
+                      videoid=None,
+                      streamType=None,
+                      assetPresentation=None,
+                      audioMode=None,
+                      audioQuality=None,
+                      videoQuality=None,
+                      manifestMimeType=None,
+                      manifest=None)
 
 
 class TidalAPI(object):
-    def __init__(self):
+    def __init__(self, poolSize=10, retry=3, cdnPoolSize=32):
         self.key = LoginKey()
+        self.poolSize = poolSize
+        # 429/5xx of the api are retried by __get__ through the rate limiter
+        self.session = getSession('api', poolSize, retry, statusRetry=False)
+        self.limiter = getRateLimiter()
+        # tracks are downloaded by several threads, each of them may use several connections
+        self.cdnSession = getSession('cdn', cdnPoolSize, retry)
+        self.albumCache = LRUCache(maxSize=512, ttl=3600)
+        self.diskCache = None
+        self.refreshCache = False
+        # max number of pages requested at the same time by __getItems__
+        self.pageThreadNum = 5
         self.__debugVar = 0
 
+    def setDiskCache(self, cache, refresh=False):
+        '''Keep the catalog responds in a DiskCache, refresh: request again and overwrite them'''
+        self.diskCache = cache
+        self.refreshCache = refresh
+
     def __toJson__(self, string: str):
         try:
             json_object = json.loads(string)
@@ -74,13 +157,46 @@ class TidalAPI(object):
             return None
         return json_object
 
-    def __get__(self, path, params={}, retry=3, urlpre=__URL_PRE__):
+    def __get__(self, path, params={}, retry=3, urlpre=__URL_PRE__, refresh=False):
+        '''refresh: skip the disk cache for this request (the respond is still stored)'''
         # deprecate the sessionId
         #header = {'X-Tidal-SessionId': self.key.sessionId}
+        header = {}
         if not isNull(self.key.accessToken):
             header = {'authorization': 'Bearer {}'.format(self.key.accessToken)}
+        params = dict(params)
         params['countryCode'] = self.key.countryCode
-        respond = requests.get(urlpre + path,  headers=header, params=params)
+
+        ttl = 0
+        if self.diskCache is not None and urlpre == __URL_PRE__:
+            ttl = __getCacheTTL__(path)
+            cacheKey = path + '?' + urlencode(sorted(params.items()))
+        if ttl > 0 and not self.refreshCache and not refresh:
+            txt = self.diskCache.get(cacheKey, ttl)
+            if txt is not None:
+                return None, json.loads(txt)
+
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                respond = self.session.get(urlpre + path, headers=header, params=params, timeout=__TIMEOUT__)
+            except (requests.ConnectionError, requests.exceptions.Timeout) as e:
+                retry -= 1
+                if retry <= 0:
+                    return "Get operation err!" + str(e), None
+                continue
+            if respond.status_code != 429 and respond.status_code < 500:
+                self.limiter.success()
+                break
+            # throttled or server error, back off and try again
+            attempt += 1
+            wait = self.limiter.throttle(respond.status_code, respond.headers.get('Retry-After'), attempt)
+            if attempt >= __MAX_THROTTLE_RETRY__:
+                break
+            logging.info("[Get operation] path=" + path + ". status=" + str(respond.status_code) +
+                         ", retry after " + str(round(wait, 2)) + "s")
+            time.sleep(wait)
         result = self.__toJson__(respond.text)
         if result is None:
             return "Get operation err!"+respond.text, None
@@ -90,23 +206,45 @@ class TidalAPI(object):
             else:
                 logging.error("[Get operation err] path=" + path + ". respon=" + respond.text)
                 return "Get operation err!", None
+        if ttl > 0:
+            self.diskCache.set(cacheKey, respond.text)
         return None, result
 
-    def __getItems__(self, path, params={}, retry=3):
-        params['limit'] = 50
+    def __getItems__(self, path, params={}, retry=3, refresh=False):
+        limit = 50
+        params = dict(params)
+        params['limit'] = limit
         params['offset'] = 0
-        ret = []
-        while True:
-            msg, data = self.__get__(path, params, retry)
+        msg, data = self.__get__(path, params, retry, refresh=refresh)
+        if msg is not None:
+            return msg, None
+        ret = list(data["items"])
+        num = len(data["items"])
+        offset = 0
+
+        # the total is known after the first page, request the others at the same time
+        total = data.get("totalNumberOfItems", 0)
+        if num >= limit and total > limit:
+            offsets = list(range(limit, total, limit))
+            with ThreadPoolExecutor(max_workers=self.pageThreadNum) as pool:
+                results = list(pool.map(lambda value: self.__get__(path, dict(params, offset=value), retry,
+                                                                   refresh=refresh), offsets))
+            for msg, data in results:
+                if msg is not None:
+                    return msg, None
+                num = len(data["items"])
+                ret.extend(data["items"])
+            offset = offsets[-1]
+
+        # without a total (or if the list grows while paging), go on until a page is not full
+        while num >= limit and (total <= 0 or len(ret) < total):
+            offset += limit
+            params['offset'] = offset
+            msg, data = self.__get__(path, params, retry, refresh=refresh)
             if msg is not None:
                 return msg, None
-            num = 0
-            for item in data["items"]:
-                num += 1
-                ret.append(item)
-            if num < 50:
-                break
-            params['offset'] += num
+            num = len(data["items"])
+            ret.extend(data["items"])
         return None, ret
 
     def __getQualityString__(self, quality: AudioQuality):
@@ -120,7 +258,7 @@ class TidalAPI(object):
 
     def __getResolutionList__(self, url):
         ret = []
-        txt = requests.get(url).text
+        txt = self.cdnSession.get(url, timeout=__TIMEOUT__).text
         # array = txt.split("#EXT-X-STREAM-INF")
         array = txt.split("#")
         for item in array:
@@ -141,7 +279,7 @@ class TidalAPI(object):
         retry = 3
         while retry > 0:
             try:
-                result = requests.post(url, data=data, auth=auth, verify=False).json()
+                result = self.session.post(url, data=data, auth=auth, verify=False, timeout=__TIMEOUT__).json()
             except (
                 requests.ConnectionError,
                 requests.exceptions.ReadTimeout,
@@ -200,7 +338,7 @@ class TidalAPI(object):
 
     def verifyAccessToken(self, accessToken):
         header = {'authorization': 'Bearer {}'.format(accessToken)}
-        result = requests.get('https://api.tidal.com/v1/sessions', headers=header).json()
+        result = self.session.get('https://api.tidal.com/v1/sessions', headers=header, timeout=__TIMEOUT__).json()
         if 'status' in result and result['status'] != 200:
             return "Login failed!", False
         return None, True
@@ -230,7 +368,7 @@ class TidalAPI(object):
 
     def loginByAccessToken(self, accessToken, userid=None):
         header = {'authorization': 'Bearer {}'.format(accessToken)}
-        result = requests.get('https://api.tidal.com/v1/sessions', headers=header).json()
+        result = self.session.get('https://api.tidal.com/v1/sessions', headers=header, timeout=__TIMEOUT__).json()
         if 'status' in result and result['status'] != 200:
             return "Login failed!", False
 
@@ -244,34 +382,40 @@ class TidalAPI(object):
         return None, True
 
     def getAlbum(self, id):
+        obj = self.albumCache.get(str(id))
+        if obj is not None:
+            return None, obj
         msg, data = self.__get__('albums/' + str(id))
-        return msg, dictToModel(data, Album())
+        obj = dictToModel(data, Album)
+        if obj is not None:
+            self.albumCache.set(str(id), obj)
+        return msg, obj
 
     def getPlaylist(self, id):
         msg, data = self.__get__('playlists/' + str(id))
-        return msg, dictToModel(data, Playlist())
+        return msg, dictToModel(data, Playlist)
 
     def getArtist(self, id):
         msg, data = self.__get__('artists/' + str(id))
-        return msg, dictToModel(data, Artist())
+        return msg, dictToModel(data, Artist)
 
     def getTrack(self, id):
         msg, data = self.__get__('tracks/' + str(id))
-        return msg, dictToModel(data, Track())
+        return msg, dictToModel(data, Track)
 
     def getVideo(self, id):
         msg, data = self.__get__('videos/' + str(id))
-        return msg, dictToModel(data, Video())
+        return msg, dictToModel(data, Video)
 
     def getLyrics(self, id):
         msg, data = self.__get__('tracks/' + str(id) + "/lyrics")
         return msg, data
 
-    def getItems(self, id, type: Type):
+    def getItems(self, id, type: Type, refresh=False):
         if type == Type.Playlist:
-            msg, data = self.__getItems__('playlists/' + str(id) + "/items")
+            msg, data = self.__getItems__('playlists/' + str(id) + "/items", refresh=refresh)
         elif type == Type.Album:
-            msg, data = self.__getItems__('albums/' + str(id) + "/items")
+            msg, data = self.__getItems__('albums/' + str(id) + "/items", refresh=refresh)
         else:
             return "invalid Type!", None, None
         if msg is not None:
@@ -280,25 +424,25 @@ class TidalAPI(object):
         videos = []
         for item in data:
             if item['type'] == 'track':
-                tracks.append(dictToModel(item['item'], Track()))
+                tracks.append(dictToModel(item['item'], Track))
             else:
-                videos.append(dictToModel(item['item'], Video()))
+                videos.append(dictToModel(item['item'], Video))
         return msg, tracks, videos
 
-    def getArtistAlbums(self, id, includeEP=False):
+    def getArtistAlbums(self, id, includeEP=False, refresh=False):
         albums = []
-        msg, data = self.__getItems__('artists/' + str(id) + "/albums")
+        msg, data = self.__getItems__('artists/' + str(id) + "/albums", refresh=refresh)
         if msg is not None:
             return msg, None
         for item in data:
-            albums.append(dictToModel(item, Album()))
+            albums.append(dictToModel(item, Album))
         if includeEP == False:
             return None, albums
-        msg, data = self.__getItems__('artists/' + str(id) + "/albums", {"filter": "EPSANDSINGLES"})
+        msg, data = self.__getItems__('artists/' + str(id) + "/albums", {"filter": "EPSANDSINGLES"}, refresh=refresh)
         if msg is not None:
             return msg, None
         for item in data:
-            albums.append(dictToModel(item, Album()))
+            albums.append(dictToModel(item, Album))
         return None, albums
 
     def getStreamUrl(self, id, quality: AudioQuality):
@@ -307,7 +451,7 @@ class TidalAPI(object):
         msg, data = self.__get__('tracks/' + str(id) + "/playbackinfopostpaywall", paras)
         if msg is not None:
             return msg, None
-        resp = dictToModel(data, __StreamRespond__())
+        resp = dictToModel(data, __StreamRespond__)
 
         if "vnd.tidal.bt" in resp.manifestMimeType:
             manifest = json.loads(base64.b64decode(resp.manifest).decode('utf-8'))
@@ -325,7 +469,7 @@ class TidalAPI(object):
         msg, data = self.__get__('videos/' + str(id) + "/playbackinfopostpaywall", paras)
         if msg is not None:
             return msg, None
-        resp = dictToModel(data, __StreamRespond__())
+        resp = dictToModel(data, __StreamRespond__)
 
         if "vnd.tidal.emu" in resp.manifestMimeType:
             manifest = json.loads(base64.b64decode(resp.manifest).decode('utf-8'))
@@ -407,40 +551,62 @@ class TidalAPI(object):
         sid = stringHelper.getSub(url, etype.name.lower() + '/', '/')
         return etype, sid
 
-    def getByString(self, string):
-        etype = Type.Null
-        obj = None
+    def parseId(self, string):
+        '''Get the type of an id without any request.
+        - 'track:123' / 'album:123' / ...: typed id
+        - uuid: playlist
+        - others: Type.Null, the type is unknown
+        '''
+        string = string.strip()
+        if ':' in string:
+            prefix, sid = string.split(':', 1)
+            for item in Type:
+                if item != Type.Null and item.name.lower() == prefix.strip().lower():
+                    return item, sid.strip()
+        if __UUID_PATTERN__.match(string):
+            return Type.Playlist, string
+        return Type.Null, string
+
+    def __getByType__(self, etype: Type, sid):
+        if etype == Type.Album:
+            return self.getAlbum(sid)
+        if etype == Type.Artist:
+            return self.getArtist(sid)
+        if etype == Type.Track:
+            return self.getTrack(sid)
+        if etype == Type.Video:
+            return self.getVideo(sid)
+        if etype == Type.Playlist:
+            return self.getPlaylist(sid)
+        return "invalid Type!", None
 
+    def getByString(self, string):
         if isNull(string):
-            return "Please enter something.", etype, obj
+            return "Please enter something.", Type.Null, None
         etype, sid = self.parseUrl(string)
         if isNull(sid):
-            sid = string
-
-        if obj is None and (etype == Type.Null or etype == Type.Album):
-            msg, obj = self.getAlbum(sid)
-        if obj is None and (etype == Type.Null or etype == Type.Artist):
-            msg, obj = self.getArtist(sid)
-        if obj is None and (etype == Type.Null or etype == Type.Track):
-            msg, obj = self.getTrack(sid)
-        if obj is None and (etype == Type.Null or etype == Type.Video):
-            msg, obj = self.getVideo(sid)
-        if obj is None and (etype == Type.Null or etype == Type.Playlist):
-            msg, obj = self.getPlaylist(sid)
-
-        if obj is None or etype != Type.Null:
+            etype, sid = self.parseId(string)
+
+        if etype != Type.Null:
+            msg, obj = self.__getByType__(etype, sid)
             return msg, etype, obj
-        if obj.__class__ == Album:
-            etype = Type.Album
-        if obj.__class__ == Artist:
-            etype = Type.Artist
-        if obj.__class__ == Track:
-            etype = Type.Track
-        if obj.__class__ == Video:
-            etype = Type.Video
-        if obj.__class__ == Playlist:
-            etype = Type.Playlist
-        return msg, etype, obj
+
+        # the type is unknown, request the candidates at the same time.
+        # the first success in the order album/artist/track/video/playlist is taken.
+        candidates = [Type.Album, Type.Artist, Type.Track, Type.Video]
+        if not sid.isdigit():
+            candidates.append(Type.Playlist)
+        msg = None
+        pool = ThreadPoolExecutor(max_workers=len(candidates))
+        try:
+            futures = [(item, pool.submit(self.__getByType__, item, sid)) for item in candidates]
+            for item, future in futures:
+                msg, obj = future.result()
+                if obj is not None:
+                    return msg, item, obj
+        finally:
+            pool.shutdown(wait=False)
+        return msg, Type.Null, None
 
     """
     def getToken(self):
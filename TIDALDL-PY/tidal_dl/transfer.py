@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+'''
+@File    :   transfer.py
+@Time    :   2021/07/10
+@Author  :   Yaronzz
+@Version :   1.0
+@Contact :   yaronhuang@foxmail.com
+@Desc    :   stream download with on-the-fly decryption
+'''
+import os
+import json
+import aigpy
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from aigpy.progressHelper import ProgressTool
+from aigpy.convertHelper import convertMemoryUnitAuto, convertMemoryUnit, MemoryUnit
+from tidal_dl.decryption import create_decryptor, DEFAULT_CHUNK_SIZE
+
+__TIMEOUT__ = (5.05, 30)
+# the resume state is saved after each step of bytes
+__STATE_STEP__ = 4 * 1024 * 1024
+# auto segment count: one connection per segment size, up to the max count
+__SEGMENT_SIZE__ = 8 * 1024 * 1024
+__MAX_SEGMENTS__ = 8
+
+
+def __newProgress__(totalSize, doneSize):
+    size, unit = convertMemoryUnitAuto(totalSize, MemoryUnit.BYTE, MemoryUnit.MB)
+    progress = ProgressTool(size, 15, unit=unit.name)
+    progress.setCurCount(convertMemoryUnit(doneSize, MemoryUnit.BYTE, unit))
+    return progress, unit
+
+
+def __getStatePath__(path):
+    return path + '.json'
+
+
+def __loadPartState__(path, identity):
+    '''Get the saved state of path, None if there is none or it belongs to another stream'''
+    if identity is None or not os.path.isfile(path):
+        return None
+    try:
+        with open(__getStatePath__(path), 'r') as f:
+            state = json.load(f)
+        if state['identity'] != identity:
+            return None
+        return state
+    except:
+        return None
+
+
+def __savePartState__(path, identity, length, done, segments=None):
+    state = {'identity': identity, 'length': length, 'done': done}
+    if segments is not None:
+        state['segments'] = segments
+    aigpy.file.write(__getStatePath__(path), json.dumps(state), 'w')
+
+
+def removePartState(path):
+    aigpy.path.remove(__getStatePath__(path))
+
+
+def __getTotalSize__(respond, offset):
+    if respond.status_code == 206:
+        total = respond.headers.get('Content-Range', '').split('/')[-1]
+        if total.isdigit():
+            return int(total)
+    length = int(respond.headers.get('Content-Length', -1))
+    return offset + length if length >= 0 else -1
+
+
+def __transfer__(session, url, path, key, nonce, offset, length, identity, showProgress, chunkSize, respond=None):
+    '''Return: (check, errmsg, changed), changed means the partial file is of another stream
+    - respond: an already sent request of the stream from byte 0, it is read instead of a new one
+    '''
+    headers = {}
+    if offset > 0:
+        headers['Range'] = 'bytes=%d-' % offset
+    totalSize = -1
+    try:
+        if respond is None:
+            respond = session.get(url, headers=headers, stream=True, timeout=__TIMEOUT__)
+        with respond:
+            respond.raise_for_status()
+            # the server ignored the range, start over
+            if offset > 0 and respond.status_code != 206:
+                offset = 0
+            totalSize = __getTotalSize__(respond, offset)
+            if offset > 0 and length > 0 and totalSize != length:
+                return False, "", True
+
+            decryptor = None
+            if key is not None:
+                decryptor = create_decryptor(key, nonce, offset)
+
+            progress = None
+            if showProgress and totalSize > 0:
+                progress, unit = __newProgress__(totalSize, offset)
+
+            aigpy.path.mkdirs(aigpy.path.getDirName(path))
+            with open(path, 'r+b' if offset > 0 else 'wb') as f:
+                f.seek(offset)
+                f.truncate()
+                saved = offset
+                for chunk in respond.iter_content(chunkSize):
+                    if decryptor is not None:
+                        chunk = decryptor.decrypt(chunk)
+                    f.write(chunk)
+                    offset += len(chunk)
+                    if progress is not None:
+                        progress.setCurCount(convertMemoryUnit(offset, MemoryUnit.BYTE, unit))
+                    if identity is not None and offset - saved >= __STATE_STEP__:
+                        f.flush()
+                        __savePartState__(path, identity, totalSize, offset)
+                        saved = offset
+
+        if totalSize > 0 and offset < totalSize:
+            return False, "Incomplete download (%d/%d bytes)." % (offset, totalSize), False
+        return True, "", False
+    except Exception as e:
+        return False, str(e), False
+    finally:
+        # the file is closed here, all bytes up to offset are on disk
+        if identity is not None and totalSize > 0:
+            __savePartState__(path, identity, totalSize, offset)
+
+
+def getRemoteSize(session, url):
+    '''Get the size of the stream by a one byte range request on the pooled session, -1 if unknown'''
+    try:
+        with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=__TIMEOUT__) as respond:
+            respond.raise_for_status()
+            if respond.status_code != 206:
+                return int(respond.headers.get('Content-Length', -1))
+            # read the byte, a connection is only put back in the pool when its respond is consumed
+            respond.content
+            total = respond.headers.get('Content-Range', '').split('/')[-1]
+            return int(total) if total.isdigit() else -1
+    except:
+        return -1
+
+
+def __openStream__(session, url):
+    '''Request the whole stream as a range, the respond tells the size and if ranges are served
+    - Return: (respond, totalSize), totalSize is -1 if the server can not serve ranges
+    '''
+    try:
+        respond = session.get(url, headers={'Range': 'bytes=0-'}, stream=True, timeout=__TIMEOUT__)
+    except:
+        return None, -1
+    if respond.status_code != 206:
+        return respond, -1
+    return respond, __getTotalSize__(respond, 0)
+
+
+def __getSegmentNum__(totalSize, segmentNum):
+    if totalSize <= 0:
+        return 1
+    if segmentNum <= 0:
+        segmentNum = min(__MAX_SEGMENTS__, totalSize // __SEGMENT_SIZE__)
+    return max(1, min(segmentNum, totalSize))
+
+
+def __splitSegments__(totalSize, segmentNum):
+    '''Return: [[start, end, done]], end is inclusive'''
+    size = totalSize // segmentNum
+    segments = []
+    for index in range(segmentNum):
+        start = index * size
+        end = totalSize - 1 if index == segmentNum - 1 else start + size - 1
+        segments.append([start, end, 0])
+    return segments
+
+
+class __SegmentContext__(object):
+    def __init__(self, path, identity, totalSize, segments, progress, unit):
+        self.path = path
+        self.identity = identity
+        self.totalSize = totalSize
+        self.segments = segments
+        self.progress = progress
+        self.unit = unit
+        self.saved = self.getDone()
+        self.changed = False
+        self.lock = threading.Lock()
+
+    def getDone(self):
+        return sum(item[2] for item in self.segments)
+
+    def update(self, force=False):
+        with self.lock:
+            done = self.getDone()
+            if self.progress is not None:
+                self.progress.setCurCount(convertMemoryUnit(done, MemoryUnit.BYTE, self.unit))
+            if self.identity is not None and not self.changed and (force or done - self.saved >= __STATE_STEP__):
+                __savePartState__(self.path, self.identity, self.totalSize, done, self.segments)
+                self.saved = done
+
+
+def __fetchSegment__(session, url, key, nonce, segment, context, chunkSize, retry=3):
+    start, end = segment[0], segment[1]
+    error = ""
+    while retry > 0 and start + segment[2] <= end:
+        retry -= 1
+        offset = start + segment[2]
+        try:
+            headers = {'Range': 'bytes=%d-%d' % (offset, end)}
+            with session.get(url, headers=headers, stream=True, timeout=__TIMEOUT__) as respond:
+                respond.raise_for_status()
+                if respond.status_code != 206:
+                    return False, "The server does not support range requests."
+                if __getTotalSize__(respond, offset) != context.totalSize:
+                    # the saved segments belong to another version of the stream
+                    context.changed = True
+                    return False, "The stream has changed."
+                decryptor = None
+                if key is not None:
+                    decryptor = create_decryptor(key, nonce, offset)
+                with open(context.path, 'r+b') as f:
+                    f.seek(offset)
+                    for chunk in respond.iter_content(chunkSize):
+                        chunk = chunk[:end + 1 - offset]
+                        if decryptor is not None:
+                            chunk = decryptor.decrypt(chunk)
+                        f.write(chunk)
+                        offset += len(chunk)
+                        segment[2] = offset - start
+                        context.update()
+            error = "The connection was closed early."
+        except Exception as e:
+            error = str(e)
+    if start + segment[2] <= end:
+        return False, "Segment %d-%d failed. %s" % (start, end, error)
+    return True, ""
+
+
+def __transferSegments__(session, url, path, key, nonce, totalSize, segments, identity, showProgress, chunkSize):
+    '''Download the segments on parallel connections into the preallocated path'''
+    progress, unit = None, None
+    if showProgress:
+        progress, unit = __newProgress__(totalSize, 0)
+    context = __SegmentContext__(path, identity, totalSize, segments, progress, unit)
+    try:
+        aigpy.path.mkdirs(aigpy.path.getDirName(path))
+        if not os.path.isfile(path) or os.path.getsize(path) != totalSize:
+            with open(path, 'wb') as f:
+                f.truncate(totalSize)
+        context.update(force=True)
+
+        with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+            futures = [pool.submit(__fetchSegment__, session, url, key, nonce, item, context, chunkSize)
+                       for item in segments]
+            results = [future.result() for future in futures]
+        for check, msg in results:
+            if not check:
+                return False, msg
+        if context.getDone() != totalSize or os.path.getsize(path) != totalSize:
+            return False, "Incomplete download (%d/%d bytes)." % (context.getDone(), totalSize)
+        return True, ""
+    except Exception as e:
+        return False, str(e)
+    finally:
+        context.update(force=True)
+        if context.changed:
+            removePartState(path)
+
+
+def downloadStream(session, url, path, key=None, nonce=None, offset=0, showProgress=False,
+                   chunkSize=DEFAULT_CHUNK_SIZE, identity=None, segmentNum=1):
+    '''Download url into path, the AES-CTR keystream is applied to the bytes as they arrive.
+    - key/nonce: from decrypt_security_token, None if the stream is not encrypted
+    - offset: number of bytes already in path, the download continues from there
+    - identity: stable id of the stream (the url changes with every token). When set, the
+      progress is kept in a sidecar of path and a later call resumes by Range requests
+    - segmentNum: number of parallel connections, 0 picks it by the size of the stream
+    - Return: (check, errmsg)
+    '''
+    check, msg, length = None, "", -1
+    state = __loadPartState__(path, identity) if offset <= 0 else None
+    if state is not None and 'segments' in state:
+        if os.path.getsize(path) == state['length']:
+            check, msg = __transferSegments__(session, url, path, key, nonce, state['length'], state['segments'],
+                                              identity, showProgress, chunkSize)
+    elif state is not None:
+        offset, length = min(int(state['done']), os.path.getsize(path)), int(state['length'])
+
+    respond = None
+    if check is None and offset <= 0 and segmentNum != 1:
+        # the first request is the download itself, it is only dropped when the stream is split
+        respond, totalSize = __openStream__(session, url)
+        num = __getSegmentNum__(totalSize, segmentNum)
+        if num > 1:
+            respond.close()
+            respond = None
+            check, msg = __transferSegments__(session, url, path, key, nonce, totalSize,
+                                              __splitSegments__(totalSize, num), identity, showProgress, chunkSize)
+
+    if check is None:
+        check, msg, changed = __transfer__(session, url, path, key, nonce, offset, length,
+                                           identity, showProgress, chunkSize, respond)
+        if changed:
+            check, msg, changed = __transfer__(session, url, path, key, nonce, 0, -1,
+                                               identity, showProgress, chunkSize)
+    if check and identity is not None:
+        removePartState(path)
+    return check, msg